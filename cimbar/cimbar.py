@@ -5,35 +5,72 @@
 Usage:
   ./cimbar.py <IMAGES>... --output=<filename> [--config=<sq8x8,sq5x5,sq5x6>] [--dark | --light]
                          [--colorbits=<0-3>] [--deskew=<0-2>] [--ecc=<0-200>]
-                         [--fountain] [--preprocess=<0,1>] [--color-correct=<0-2>]
+                         [--fountain | --segmented] [--preprocess=<0,1>] [--color-correct=<0-2>]
+                         [--jobs=<n>] [--deskew-jobs=<n>] [--cv-threads=<n>] [--stride=<n>] [--raw-size=<WxH>]
+                         [--dictionary=<file>...] [--unpack]
   ./cimbar.py --encode (<src_data> | --src_data=<filename>) (<output> | --output=<filename>)
                        [--config=<sq8x8,og8x8,sq5x5,sq5x6>] [--dark | --light]
-                       [--colorbits=<0-3>] [--ecc=<0-150>] [--fountain]
+                       [--colorbits=<0-3>] [--ecc=<0-150>] [--fountain | --segmented]
+                       [--jobs=<n>] [--frames=<start:stop>] [--fps=<n>] [--zstd-level=<n>] [--zstd-threads=<n>]
+                       [--dictionary=<file>] [--segment-size=<bytes>]
+  ./cimbar.py --encode --pack <FILES>... --output=<filename>
+                       [--config=<sq8x8,og8x8,sq5x5,sq5x6>] [--dark | --light]
+                       [--colorbits=<0-3>] [--ecc=<0-150>] [--fountain | --segmented]
+                       [--jobs=<n>] [--frames=<start:stop>] [--fps=<n>] [--zstd-level=<n>] [--zstd-threads=<n>]
+                       [--dictionary=<file>] [--segment-size=<bytes>]
   ./cimbar.py (-h | --help)
 
 Examples:
   python -m cimbar --encode myfile.txt cimb-code.png
   python -m cimbar cimb-code.png -o myfile.txt
+  python -m cimbar --encode myfile.txt cimb-code.mkv --fountain --fps=10
+  python -m cimbar capture.mp4 -o myfile.txt --fountain --stride=2
+  python -m cimbar --encode --pack a.txt b.txt somedir/ -o cimb-code.png --fountain
+  python -m cimbar cimb-code*.png -o outdir/ --fountain --unpack
+  ffmpeg -i capture.mp4 -f rawvideo -pix_fmt rgb24 - | python -m cimbar - --raw-size=1920x1080 -o myfile.txt -f
+  tar c somedir | python -m cimbar --encode - cimb-code.mkv --segmented
+  python -m cimbar cimb-code.mkv -o - --segmented | tar x
 
 Options:
   -h --help                        Show this help.
   --version                        Show version.
-  --src_data=<filename>            For encoding. Data to encode.
-  -o --output=<filename>           For encoding. Where to store output. For encodes, this may be interpreted as a prefix.
+  --src_data=<filename>            For encoding. Data to encode. - is stdin.
+  -o --output=<filename>           Where to store output. For encodes, this may be interpreted as a prefix. - is stdout.
+                                   .apng, .mkv and .avi outputs hold every frame. - is a raw rgb24 stream on stdout.
   -c --colorbits=<0-3>             How many colorbits in the image. [default: 2]
   -e --ecc=<0-200>                 Reed solomon error correction level. 0 is no ecc. [default: auto]
   -f --fountain                    Use fountain encoding scheme.
+  --segmented                      Use the segmented fountain encoding scheme, for inputs too big to fit in memory.
+  --segment-size=<bytes>           For --segmented encodes. How much (compressed) input goes in each segment, and so
+                                   about how much the encoder and decoder hold in memory. Default: 4MB.
   --config=<config>                Choose configuration from sq8x8,sq5x5,sq5x6. [default: sq8x8]
   --dark                           Use dark palette. [default]
   --light                          Use light palette.
   --color-correct=<0-7>            Color correction. 0 is off. 1 is white balance. 3 is 2-pass on a fountain-encoded image. [default: 1]
   --deskew=<0-2>                   Deskew level. 0 is no deskew. Should usually be 0 or default. [default: 1]
   --preprocess=<0,1>               Sharpen image before decoding. Default is to guess. [default: -1]
+  --frames=<start:stop>            For encoding. Only generate these frames. e.g. 10 or 10:20 or 10:
+  --fps=<n>                        For encoding to .apng or video. Frame rate. [default: 15]
+  --zstd-level=<n>                 For fountain encodes. zstd level. Lowered for incompressible inputs. [default: 16]
+  --zstd-threads=<n>               For fountain encodes. zstd threads. Default: 1 per cpu, for big inputs. [default: auto]
+  --dictionary=<file>              For fountain encodes. A trained zstd dictionary, e.g. from `zstd --train`.
+                                   Decodes can take several, and use the one the encode did.
+  --pack                           For encoding. Pack several files (or directories) into one encode.
+  --unpack                         For decoding a --pack encode. Unpacks the files into the --output directory.
+  -j --jobs=<n>                    How many frames to encode or decode in parallel. [default: 1]
+  --deskew-jobs=<n>                For parallel decodes. Threads for finding and deskewing images. [default: auto]
+  --cv-threads=<n>                 For parallel decodes. Threads per process for opencv's own use. [default: 1]
+  --stride=<n>                     For decoding videos and frame streams. Only decode every nth frame. [default: 1]
+  --raw-size=<WxH>                 For decoding. The inputs are raw rgb24 frame streams of this size. - is stdin.
 """
-from collections import defaultdict
+import sys
+from collections import defaultdict, namedtuple
+from contextlib import ExitStack, closing, redirect_stdout
+from functools import lru_cache
 from io import BytesIO
 from os import path
 from tempfile import TemporaryDirectory
+from threading import Event, Lock
 
 import cv2
 import numpy
@@ -41,18 +78,34 @@ from docopt import docopt
 from PIL import Image
 
 from cimbar import conf
-from cimbar.deskew.deskewer import deskewer
-from cimbar.encode.cell_positions import cell_positions, AdjacentCellFinder, FloodDecodeOrder
-from cimbar.encode.cimb_translator import CimbEncoder, CimbDecoder, avg_color, possible_colors
+from cimbar.deskew.deskewer import deskewer, deskew_image
+from cimbar.encode.cell_positions import cell_positions, cell_drift, AdjacentCellFinder, FloodDecodeOrder
+from cimbar.encode.cimb_translator import CIMBAR_ROOT, CimbEncoder, CimbDecoder, avg_color, palettize, possible_colors
+from cimbar.encode.ldpc import ldpc_stream
 from cimbar.encode.rss import reed_solomon_stream
-from cimbar.fountain.header import fountain_header
+from cimbar.fountain.header import fountain_header, segment_header
 from cimbar.util.bit_file import bit_file
-from cimbar.util.interleave import interleave, interleave_reverse, interleaved_writer
+from cimbar.util.interleave import (
+    interleave, interleave_permutation, deinterleave_bytes, deinterleave_distance, deinterleave_bit_scores
+)
+from cimbar.util.pack import pack_reader, pack_writer
+from cimbar.util.pipeline import pipeline, stage
+from cimbar.util.shared_frames import shared_frame, shared_frame_pool
+from cimbar.util.video import (
+    APNG_EXTENSIONS, apng_writer, is_video, parse_frame_size, raw_frames, raw_writer, video_frames, video_writer
+)
 
 
 BITS_PER_COLOR=conf.BITS_PER_COLOR
 
 
+# per-cell decode results for one image, indexed by cell. Opt in with state_info['confidence'] = True.
+# bits: symbol bits | (color bits << BITS_PER_SYMBOL)
+# symbol_distance: hamming distance to the best matching tile hash. color_distance: to the best palette color.
+# cells: (x, y) where each cell was actually found, after drift
+DecodedFrame = namedtuple('DecodedFrame', 'bits symbol_distance color_distance cells')
+
+
 def get_deskew_params(level):
     level = int(level)
     return {
@@ -69,6 +122,30 @@ def use_split_mode():
     return getattr(conf, 'SPLIT_MODE', True)
 
 
+def ecc_mode():
+    return getattr(conf, 'ECC_MODE', 'reed_solomon')
+
+
+def _ecc_stream(*args, **kwargs):
+    if ecc_mode() == 'ldpc':
+        return ldpc_stream(*args, **kwargs)
+    return reed_solomon_stream(*args, **kwargs)
+
+
+def _symbol_llr(distance):
+    '''
+    symbol hash distance -> log likelihood ratio magnitude, for soft decision decoding.
+    calibrated against the error rates per distance on perspective-warped test images:
+    <8: ~0.03%, 8-10: ~0.8%, 10-12: ~4%, 12-16: ~10%, 16+: ~22%
+    '''
+    return numpy.interp(distance, [0, 6, 9, 11, 13, 15, 18], [9, 8, 4.8, 3.2, 2.2, 1.7, 1.3])
+
+
+def _color_llr(distance):
+    ''' palette distance -> log likelihood ratio magnitude. Color errors are rare until the distance gets large. '''
+    return numpy.interp(distance, [0, 15000, 20000, 30000], [9, 7, 4, 2])
+
+
 def num_cells():
     return conf.CELL_DIM_Y*conf.CELL_DIM_X - (conf.MARKER_SIZE_X*conf.MARKER_SIZE_Y * 4)
 
@@ -113,12 +190,12 @@ def _get_expected_fountain_headers(headers, bits_per_symbol=conf.BITS_PER_SYMBOL
     return res
 
 
-def _get_fountain_header_cell_index(cells, expected_vals):
+def _get_fountain_header_cell_index(cells, expected_vals, header_length=fountain_header.length):
     # TODO: misleading to say this works for all FOUNTAIN_BLOCKS values...
     fountain_blocks = conf.FOUNTAIN_BLOCKS or num_fountain_blocks()
     end = capacity(BITS_PER_COLOR) * 8 // BITS_PER_COLOR
     header_start_interval = capacity(bits_per_op()) * 8 // fountain_blocks // BITS_PER_COLOR
-    header_len = (fountain_header.length-2) * 8 // BITS_PER_COLOR
+    header_len = (header_length-2) * 8 // BITS_PER_COLOR
 
     cell_idx = []
     i = 0
@@ -165,6 +242,7 @@ def _derive_color_lookups(ct, color_img, cells, fount_headers, splits=0):
     header_cell_locs = _get_fountain_header_cell_index(
         list(interleave(cells, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS)),
         _get_expected_fountain_headers(fount_headers),
+        fount_headers[0].length,
     )
     print(header_cell_locs)
 
@@ -230,17 +308,39 @@ def _preprocess_for_decode(img):
     return img
 
 
-def _get_decoder_stream(outfile, ecc, fountain):
-    # set up the outstream: image -> reedsolomon -> fountain -> zstd_decompress -> raw bytes
-    f = open(outfile, 'wb')
+def _fountain_decoder(fountain):
+    if fountain == 'segmented':
+        from cimbar.fountain.segmented_decoder_stream import segmented_decoder_stream
+        return segmented_decoder_stream
+    from cimbar.fountain.fountain_decoder_stream import fountain_decoder_stream
+    return fountain_decoder_stream
+
+
+def _fountain_header(fountain):
+    return segment_header if fountain == 'segmented' else fountain_header
+
+
+def _open(filename, mode):
+    ''' open(), except "-" is stdin or stdout. Closing it leaves the real stdin/stdout open. '''
+    if filename == '-':
+        # the file descriptors, not sys.stdout -- decode() may have pointed that at stderr
+        return open(0 if 'r' in mode else 1, mode, closefd=False)
+    return open(filename, mode)
+
+
+def _get_decoder_stream(outfile, ecc, fountain, with_ecc=True, dictionaries=None, unpack=False):
+    # set up the outstream: image -> reedsolomon -> fountain -> zstd_decompress -> raw bytes (-> unpack)
+    f = pack_writer(outfile) if unpack else _open(outfile, 'wb')
     if fountain:
-        import zstandard as zstd
-        from cimbar.fountain.fountain_decoder_stream import fountain_decoder_stream
-        decompressor = zstd.ZstdDecompressor().stream_writer(f)
-        f = fountain_decoder_stream(decompressor, _fountain_chunk_size(ecc))
+        from cimbar.util.compression import dictionary_decompressor, load_dictionary
+        decompressor = dictionary_decompressor(f, [load_dictionary(d) for d in dictionaries or []])
+        f = _fountain_decoder(fountain)(decompressor, _fountain_chunk_size(ecc))
     on_rss_failure = b'' if fountain else None
 
-    stream = reed_solomon_stream(f, ecc, conf.ECC_BLOCK_SIZE, mode='write', on_failure=on_rss_failure) if ecc else f
+    if ecc and with_ecc:
+        stream = _ecc_stream(f, ecc, conf.ECC_BLOCK_SIZE, mode='write', on_failure=on_rss_failure)
+    else:
+        stream = f
     fount = f if fountain else None
     return stream, fount
 
@@ -283,7 +383,7 @@ def _decode_symbols(ct, img):
     for i, (x, y), drift in decode_order:
         best_bits, best_cell, best_dx, best_dy, best_distance = _decode_cell(ct, img, x, y, drift)
         decode_order.update(best_dx, best_dy, best_distance)
-        yield i, best_bits, best_cell
+        yield i, best_bits, best_cell, best_distance
 
 
 def _calc_ccm(ct, color_lookups, cc_setting, state_info):
@@ -329,10 +429,51 @@ def _calc_ccm(ct, color_lookups, cc_setting, state_info):
         ct.colors = color_lookups[0]
 
 
+def _probe_frame_header(ct, img, color_img, ecc, header_length):
+    '''
+    decode just the cells that make up the frame's first ecc block, and return the fountain header at the start of it.
+    that's ~2.5% of the cells, so it's a cheap way to spot a frame we've already seen.
+    returns None if the ecc can't vouch for what we found.
+    '''
+    cell_pos, _ = cell_positions(conf.CELL_SPACING_X, conf.CELL_SPACING_Y, conf.CELL_DIM_X, conf.CELL_DIM_Y,
+                                 conf.CELLS_OFFSET, conf.MARKER_SIZE_X, conf.MARKER_SIZE_Y)
+    split = use_split_mode()
+    bits = conf.BITS_PER_SYMBOL if split else bits_per_op()
+    cells = deinterleave_order()[:-(-conf.ECC_BLOCK_SIZE * 8 // bits)]
+
+    values = numpy.zeros(len(cell_pos), dtype=numpy.uint32)
+    for i in cells:
+        x, y = cell_pos[i]
+        # no neighbors to tell us about drift, so this is a bit worse than the full decode. The ecc can take it
+        value, (cx, cy), _, __, ___ = _decode_cell(ct, img, x, y, cell_drift())
+        if not split:
+            color, _ = ct.decode_color_distance(_crop_cell(color_img, cx, cy), 0)
+            value += color << conf.BITS_PER_SYMBOL
+        values[i] = value
+
+    buff = deinterleave_bytes(values, cells, bits)[:conf.ECC_BLOCK_SIZE]
+    out = BytesIO()
+    _ecc_stream(out, ecc, conf.ECC_BLOCK_SIZE, mode='write', on_failure=b'').write(buff)
+    msg = out.getvalue()
+    return msg[:header_length] if msg else None
+
+
 def _decode_iter(ct, img, color_img, state_info={}):
+    # with a set of (first chunk) headers to check against, we can skip frames we've already decoded
+    seen = state_info.get('seen_headers')
+    if seen is not None:
+        header = _probe_frame_header(ct, img, color_img, state_info['ecc'], state_info['header_length'])
+        if header in seen:
+            print('already have this frame. Skipping')
+            return
+        # it isn't seen until the fountain decoder takes it. See _mark_seen()
+        state_info['probed_header'] = header
+
     decoding = sorted(_decode_symbols(ct, img))
+    # the symbol hash distance for each cell. Lower is better. The caller can use it to flag likely errors
+    state_info['symbol_distance'] = numpy.array([distance for _, __, ___, distance in decoding])
     if use_split_mode():
-        for i, bits, _ in decoding:
+        for i, bits, _, __ in decoding:
             yield i, bits
         yield -1, None
 
@@ -347,37 +488,69 @@ def _decode_iter(ct, img, color_img, state_info={}):
         cc_setting = state_info['color_correct']
         splits = 2 if cc_setting in (6, 7) else 0
 
-        cells = [cell for _, __, cell in decoding]
+        cells = [cell for _, __, cell, ___ in decoding]
         color_lookups = _derive_color_lookups(ct, color_img, cells, state_info.get('headers'), splits)
         print('color lookups:')
         print(color_lookups)
 
         _calc_ccm(ct, color_lookups, cc_setting, state_info)
 
+    confidence = state_info.get('confidence')
+    if confidence:
+        colors = numpy.zeros(len(decoding), dtype=numpy.uint32)
+        color_distance = numpy.zeros(len(decoding))
+
     print('beginning decode colors pass...')
     midX = conf.TOTAL_SIZE // 2
     midY = conf.TOTAL_SIZE // 2
-    for i, bits, cell in decoding:
+    for i, bits, cell, _ in decoding:
         testX, testY = cell
         best_cell = _crop_cell(color_img, testX, testY)
         decode_sector = 0 if ct.ccm is None else _decode_sector_calc((midX, midY), testX, testY, len(ct.ccm))
+        color, distance = ct.decode_color_distance(best_cell, 0)
+        if confidence:
+            colors[i] = color
+            color_distance[i] = distance
         if use_split_mode():
-            yield i, ct.decode_color(best_cell, 0)
+            yield i, color
         else:
-            yield i, bits + (ct.decode_color(best_cell, 0) << conf.BITS_PER_SYMBOL)
+            yield i, bits + (color << conf.BITS_PER_SYMBOL)
+
+    if confidence:
+        symbols = numpy.array([bits for _, bits, __, ___ in decoding], dtype=numpy.uint32)
+        state_info['frame'] = DecodedFrame(
+            bits=symbols | (colors << conf.BITS_PER_SYMBOL),
+            symbol_distance=state_info['symbol_distance'],
+            color_distance=color_distance,
+            cells=numpy.array([cell for _, __, cell, ___ in decoding]),
+        )
+
+
+def _load_image_array(src_image, dark, should_preprocess, deskew, auto_dewarp):
+    # src_image is a (BGR) numpy array, like cv2 gives us. Same as the file path below, but without the temp file
+    if deskew:
+        img = deskew_image(src_image, dark, auto_dewarp=auto_dewarp)
+        if should_preprocess < 0:
+            should_preprocess = src_image.shape[0] < conf.TOTAL_SIZE or src_image.shape[1] < conf.TOTAL_SIZE
+    else:
+        img = src_image
+    return Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)), should_preprocess
 
 
 def decode_iter(src_image, dark, should_preprocess, color_correct, deskew, auto_dewarp, state_info={}):
+    ''' src_image is a path, or a (BGR) numpy array '''
     tempdir = None
-    if deskew:
+    if isinstance(src_image, numpy.ndarray):
+        color_img, should_preprocess = _load_image_array(src_image, dark, should_preprocess, deskew, auto_dewarp)
+    elif deskew:
         tempdir = TemporaryDirectory()
         temp_img = path.join(tempdir.name, path.basename(src_image))  # or /tmp
         dims = detect_and_deskew(src_image, temp_img, dark, auto_dewarp)
         if should_preprocess < 0:
             should_preprocess = dims[0] < conf.TOTAL_SIZE or dims[1] < conf.TOTAL_SIZE
-        color_img = Image.open(temp_img)
+        color_img = Image.open(temp_img).convert('RGB')
     else:
-        color_img = Image.open(src_image)
+        color_img = Image.open(src_image).convert('RGB')
 
     ct = CimbDecoder(dark, symbol_bits=conf.BITS_PER_SYMBOL, color_bits=conf.BITS_PER_COLOR)
     img = _preprocess_for_decode(color_img) if should_preprocess else color_img
@@ -394,156 +567,655 @@ def decode_iter(src_image, dark, should_preprocess, color_correct, deskew, auto_
             pass
 
 
-def decode(src_images, outfile, dark=False, ecc=conf.ECC, fountain=False, force_preprocess=False, color_correct=False,
-           deskew=True, auto_dewarp=False):
-    cells, _ = cell_positions(conf.CELL_SPACING_X, conf.CELL_SPACING_Y, conf.CELL_DIM_X, conf.CELL_DIM_Y,
-                              conf.CELLS_OFFSET, conf.MARKER_SIZE_X, conf.MARKER_SIZE_Y)
-    interleave_lookup, block_size = interleave_reverse(cells, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS)
-    dstream, fount = _get_decoder_stream(outfile, ecc, fountain)
-    dupe_stream = dupe_pass = None
+def decode_frame(src_image, dark, should_preprocess, color_correct, deskew, auto_dewarp, state_info=None):
+    ''' decode a single image into a DecodedFrame, without the stream plumbing '''
+    state_info = {} if state_info is None else state_info
+    state_info['confidence'] = True
+    for _ in decode_iter(src_image, dark, should_preprocess, color_correct, deskew, auto_dewarp, state_info):
+        pass
+    return state_info['frame']
+
+
+def _write_pass(f, values, order, bits_per_op, cell_distance=None, cell_llr=None):
+    buff = deinterleave_bytes(values, order, bits_per_op)
+    if cell_distance is not None and isinstance(f, reed_solomon_stream):
+        f.write(buff, deinterleave_distance(cell_distance, order, bits_per_op))
+    elif cell_llr is not None and isinstance(f, ldpc_stream):
+        f.write(buff, deinterleave_bit_scores(cell_llr, order, bits_per_op))
+    else:
+        f.write(buff)
+
+
+def _dedupe_params(ecc, fountain):
+    '''
+    state_info for skipping frames we've already decoded. This relies on every frame starting with a fresh fountain
+    chunk, and on the ecc to check the header we find there.
+    '''
+    if not fountain or not ecc or not _chunks_per_frame(_fountain_chunk_size(ecc), ecc):
+        return None
+    return {'seen_headers': set(), 'ecc': ecc, 'header_length': _fountain_header(fountain).length}
+
+
+def _accepted(headers, header):
+    ''' did the fountain decoder get a good chunk with this header? headers is what it got from the frame '''
+    return any(not hdr.bad() and bytes(hdr) == header for hdr in headers)
+
+
+def _mark_seen(seen, header, headers):
+    # the probe can misread a header the full decode gets right. Only skip later copies once the fountain has this one
+    if header is not None and _accepted(headers, header):
+        seen.add(header)
+
+
+def _decode_image(imgf, outstream, dupe_stream, fount, order, dark, force_preprocess, color_correct, deskew,
+                  auto_dewarp, done=None, dedupe=None):
+    '''
+    done (optional) is checked after the symbol pass. If it says we have everything, skip the color pass.
+    dedupe (optional) is a dict of state_info for _probe_frame_header(), to skip frames we've already seen.
+    returns False if the frame was skipped.
+    '''
+    values = numpy.zeros(num_cells(), dtype=numpy.uint32)
+    state_info = {'confidence': True, **(dedupe or {})}
+    headers_before = len(fount.headers) if fount else 0
+
+    def used():
+        if dedupe:
+            _mark_seen(dedupe['seen_headers'], state_info.get('probed_header'), fount.headers[headers_before:])
+        return True
+
+    for i, bits in decode_iter(imgf, dark, force_preprocess, color_correct, deskew, auto_dewarp, state_info):
+        if i == -1:
+            # flush the symbol pass, then move on to colors
+            # low confidence symbols become erasure candidates for the reed solomon decoder
+            distance = state_info.get('symbol_distance')
+            llr = _symbol_llr(distance)
+            _write_pass(outstream, values, order, conf.BITS_PER_SYMBOL, distance, llr)
+            if dupe_stream:
+                _write_pass(dupe_stream, values, order, conf.BITS_PER_SYMBOL, distance, llr)
+            if done and done():
+                return used()
+            if fount:
+                state_info['headers'] = fount.headers
+            continue
+        values[i] = bits
+
+    if 'frame' not in state_info:  # skipped
+        return False
+    frame = state_info['frame']
+    if use_split_mode():
+        _write_pass(outstream, values, order, BITS_PER_COLOR, frame.color_distance, _color_llr(frame.color_distance))
+    else:
+        llr = numpy.minimum(_symbol_llr(frame.symbol_distance), _color_llr(frame.color_distance))
+        _write_pass(outstream, values, order, bits_per_op(), frame.symbol_distance, llr)
+    return used()
+
+
+class _chunk_collector:
+    '''
+    stands in for the fountain_decoder_stream inside a worker process.
+    keeps the ecc-corrected bytes for the parent, and records the fountain headers it sees along the way --
+    the color pass may need them.
+    '''
+    def __init__(self, chunk_size, header=fountain_header):
+        self.chunk_size = chunk_size
+        self.header = header
+        self.buffer = bytearray()
+        self.headers = []
+        self.pos = 0
+
+    def write(self, buffer):
+        self.buffer += buffer
+        while len(self.buffer) - self.pos >= self.chunk_size:
+            self.headers.append(self.header(bytes(self.buffer[self.pos:self.pos + self.header.length])))
+            self.pos += self.chunk_size
+
+    def getvalue(self):
+        return bytes(self.buffer)
+
+
+def _worker_params(cv_threads=1):
+    # what a pool worker needs to match our config. spawned (not forked) workers start from the default one
+    conf_vals = {k: v for k, v in vars(conf).items() if k.isupper()}
+    return conf_vals, BITS_PER_COLOR, cv_threads
+
+
+def _init_worker(conf_vals, bits_per_color, cv_threads):
+    global BITS_PER_COLOR
+    BITS_PER_COLOR = bits_per_color
+    for k, v in conf_vals.items():
+        setattr(conf, k, v)
+    # one process per core already. Don't let opencv fan out on top of that
+    cv2.setNumThreads(cv_threads)
+
+
+def _decode_image_job(args):
+    ''' decode one image in a worker process. Returns the ecc-corrected bytes, for the parent to write '''
+    imgf, dark, ecc, fountain, force_preprocess, color_correct, deskew, auto_dewarp = args
+    if isinstance(imgf, shared_frame):
+        imgf = imgf.array()
+
+    def ecc_stream(f, on_failure):
+        return _ecc_stream(f, ecc, conf.ECC_BLOCK_SIZE, mode='write', on_failure=on_failure) if ecc else f
+
+    collector = _chunk_collector(_fountain_chunk_size(ecc), _fountain_header(fountain))
+    outstream = ecc_stream(collector, b'' if fountain else None)
+    fount = collector if fountain else None
+    dupe_stream = None
+    if color_correct >= 3 and not fountain:
+        fount = _chunk_collector(_fountain_chunk_size(ecc))
+        dupe_stream = ecc_stream(fount, b'')
+
+    _decode_image(imgf, outstream, dupe_stream, fount, deinterleave_order(), dark, force_preprocess, color_correct,
+                  deskew, auto_dewarp)
+    return collector.getvalue()
+
+
+def _load_stage(imgf):
+    return imgf if isinstance(imgf, numpy.ndarray) else cv2.imread(imgf)
+
+
+def _deskew_stage(dark, force_preprocess, deskew, auto_dewarp):
+    # (image, should_preprocess, probed header). The last one is for _dedupe_stage() to fill in
+    def run(img):
+        if not deskew:
+            return img, force_preprocess, None
+        out = deskew_image(img, dark, auto_dewarp=auto_dewarp)
+        if out is None:
+            return None, force_preprocess, None
+        should_preprocess = force_preprocess
+        if should_preprocess < 0:
+            should_preprocess = img.shape[0] < conf.TOTAL_SIZE or img.shape[1] < conf.TOTAL_SIZE
+        return out, should_preprocess, None
+    return run
+
+
+def _dedupe_stage(dark, dedupe):
+    '''
+    skip frames whose header we've seen, or that are being decoded right now.
+    the header only moves from in_flight to seen once the fountain decoder takes it, in _decode_parallel()
+    '''
+    def run(deskewed):
+        img, should_preprocess, _ = deskewed
+        if img is None:
+            return deskewed
+
+        color_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        symbol_img = _preprocess_for_decode(color_img) if should_preprocess else color_img
+        ct = CimbDecoder(dark, symbol_bits=conf.BITS_PER_SYMBOL, color_bits=BITS_PER_COLOR)
+        header = _probe_frame_header(ct, symbol_img, color_img, dedupe['ecc'], dedupe['header_length'])
+        with dedupe['lock']:
+            if header in dedupe['seen_headers'] or header in dedupe['in_flight']:
+                print('already have this frame. Skipping')
+                return None, should_preprocess, None
+            if header is not None:
+                dedupe['in_flight'].add(header)
+        return img, should_preprocess, header
+    return run
+
+
+def _decode_stage(pool, frame_pool, dark, ecc, fountain, color_correct, cancelled):
+    # (ecc-corrected bytes, probed header). The bytes are None if there was nothing to decode
+    def run(deskewed):
+        img, should_preprocess, header = deskewed
+        if img is None:
+            return None, header
+
+        # the image goes to the worker through shared memory, rather than being pickled
+        handle = frame_pool.put(img) if frame_pool.fits(img) else None
+        try:
+            args = (handle or img, dark, ecc, fountain, should_preprocess, color_correct, False, False)
+            res = pool.apply_async(_decode_image_job, (args,))
+            while not res.ready():
+                if cancelled.is_set():
+                    return None, header
+                res.wait(0.1)
+            return res.get(), header
+        finally:
+            if handle:
+                frame_pool.release(handle)
+    return run
+
+
+def _decode_parallel(src_images, outfile, jobs, dark, ecc, fountain, force_preprocess, color_correct, deskew,
+                     auto_dewarp, deskew_jobs=None, cv_threads=1, skip_duplicates=True, dictionaries=None,
+                     unpack=False):
+    '''
+    a pipeline: load -> deskew (threads, in this process) -> [skip duplicates] -> decode passes + ecc
+    (a pool of `jobs` processes) -> fountain/output file (here).
+    the stages are connected by small bounded queues, so while frame N is in the ecc, frame N+1 is being deskewed.
+    returns the number of frames used.
+    '''
+    from multiprocessing import Pool, resource_tracker
+
+    f, fount = _get_decoder_stream(outfile, ecc, fountain, with_ecc=False, dictionaries=dictionaries, unpack=unpack)
+    prev_cv_threads = cv2.getNumThreads()
+    cv2.setNumThreads(cv_threads)
+
+    # the deskewed frames are all the same size. Only raw, undeskewed frames might not fit
+    slot_bytes = conf.TOTAL_SIZE * conf.TOTAL_SIZE * 3
+    cancelled = Event()
+    frames_used = 0
+    with ExitStack() as stack:
+        stack.callback(cv2.setNumThreads, prev_cv_threads)
+        stack.enter_context(f)
+        # forked workers share the parent's resource tracker, but only if it's already running. Otherwise each one
+        # starts its own, which sees our shared memory as leaked, and tries to clean it up after we've unlinked it
+        resource_tracker.ensure_running()
+        # on the way out, this kills any decodes still in progress
+        pool = stack.enter_context(
+            Pool(jobs, initializer=_init_worker, initargs=_worker_params(cv_threads))
+        )
+        frame_pool = stack.enter_context(shared_frame_pool(jobs, slot_bytes))
+
+        deskew_jobs = deskew_jobs or max(1, jobs // 4)
+        stages = [
+            stage(_load_stage, 1),
+            stage(_deskew_stage(dark, force_preprocess, deskew, auto_dewarp), deskew_jobs),
+            stage(_decode_stage(pool, frame_pool, dark, ecc, fountain, color_correct, cancelled), jobs),
+        ]
+        dedupe = _dedupe_params(ecc, fountain) if skip_duplicates else None
+        if dedupe:
+            dedupe.update(in_flight=set(), lock=Lock())
+            stages.insert(2, stage(_dedupe_stage(dark, dedupe), deskew_jobs))
+        # fountain chunks can go in any order. Raw output has to stay in image order
+        results = stack.enter_context(closing(pipeline(src_images, stages, ordered=not fount)))
+        # first thing on the way out: stop waiting on the decodes still in progress
+        stack.callback(cancelled.set)
+        for res, header in results:
+            if res is None:
+                continue
+            headers_before = len(fount.headers) if fount else 0
+            f.write(res)
+            frames_used += 1
+            if dedupe:
+                with dedupe['lock']:
+                    dedupe['in_flight'].discard(header)
+                    _mark_seen(dedupe['seen_headers'], header, fount.headers[headers_before:])
+            if fount and fount.done:
+                break
+    return frames_used
+
+
+def _decode_serial(src_images, outfile, dark, ecc, fountain, force_preprocess, color_correct, deskew, auto_dewarp,
+                   skip_duplicates=True, dictionaries=None, unpack=False):
+    order = deinterleave_order()
+    dedupe = _dedupe_params(ecc, fountain) if skip_duplicates else None
+    dstream, fount = _get_decoder_stream(outfile, ecc, fountain, dictionaries=dictionaries, unpack=unpack)
+    # stop as soon as the fountain decoder has everything. (Not the dupe_stream's, that one is just for the headers)
+    done = (lambda fount=fount: fount.done) if fount else None
+    dupe_stream = None
     if color_correct >= 3 and not fount:
-        dupe_stream, fount = _get_decoder_stream('/dev/null', ecc, True)
+        dupe_stream, fount = _get_decoder_stream('/dev/null', ecc, True, dictionaries=dictionaries)
+
+    frames_used = 0
     with dstream as outstream:
         for imgf in src_images:
-            if use_split_mode():
-                first_pass = interleaved_writer(
-                    f=outstream, bits_per_op=conf.BITS_PER_SYMBOL, mode='write', keep_open=True
-                )
-                if dupe_stream:
-                    dupe_pass = interleaved_writer(
-                        f=dupe_stream, bits_per_op=conf.BITS_PER_SYMBOL, mode='write', keep_open=True
-                    )
-                second_pass = interleaved_writer(
-                    f=outstream, bits_per_op=BITS_PER_COLOR, mode='write', keep_open=True
-                )
-            else:
-                first_pass = interleaved_writer(f=outstream, bits_per_op=bits_per_op(), mode='write', keep_open=True)
-                second_pass = None
-
-            # this is a bit goofy, might refactor it to have less "loop through writers" weirdness
-            iw = first_pass
-            state_info = {}
-            for i, bits in decode_iter(
-                    imgf, dark, force_preprocess, color_correct, deskew, auto_dewarp, state_info
-            ):
-                if i == -1:
-                    # flush and move to the second writer
-                    with iw:
-                        pass
-                    if dupe_pass:
-                        with dupe_pass:
-                            pass
-                    iw = second_pass
-                    if fount:
-                        state_info['headers'] = fount.headers
-                    continue
-                block = interleave_lookup[i] // block_size
-                iw.write(bits, block)
-                if dupe_pass:
-                    dupe_pass.write(bits, block)
-
-            # flush iw
-            with iw:
-                pass
+            frames_used += _decode_image(imgf, outstream, dupe_stream, fount, order, dark, force_preprocess,
+                                         color_correct, deskew, auto_dewarp, done, dedupe)
+            if done and done():
+                break
+    return frames_used
+
+
+def frame_sources(src_images, stride=1, raw_size=None):
+    '''
+    expand the decoder's inputs into images. Image paths pass through as-is. "-" is one image on stdin.
+    videos, and raw rgb24 frame streams if raw_size (width, height) is set, become every `stride`th frame.
+    it's lazy, so a decode that finishes early stops reading.
+    '''
+    for src in src_images:
+        if raw_size:
+            yield from raw_frames(src, *raw_size, stride=stride)
+        elif src == '-':
+            # one encoded image (png, jpg...) on stdin
+            with _open(src, 'rb') as f:
+                yield cv2.imdecode(numpy.frombuffer(f.read(), dtype=numpy.uint8), cv2.IMREAD_COLOR)
+        elif is_video(src):
+            yield from video_frames(src, stride)
+        else:
+            yield src
+
+
+def decode(src_images, outfile, dark=False, ecc=conf.ECC, fountain=False, force_preprocess=False, color_correct=False,
+           deskew=True, auto_dewarp=False, jobs=1, deskew_jobs=None, cv_threads=1, skip_duplicates=True,
+           dictionaries=None, unpack=False):
+    '''
+    src_images is an iterable of paths and/or (BGR) numpy arrays.
+    jobs > 1 decodes in parallel. deskew_jobs and cv_threads tune the pipeline for that case, see _decode_parallel()
+    skip_duplicates: for fountain decodes, check each frame's first header before the full decode, and skip the frame
+    if we've seen it before.
+    dictionaries: zstd dictionary files. The encode says which one (if any) it used.
+    unpack: the encode packed several files. outfile is the directory to unpack them into.
+    outfile "-" is stdout. The decoded bytes go out as they're ready.
+    '''
+    with ExitStack() as stack:
+        if outfile == '-':
+            # stdout is for the data. Everything we'd normally print (including from the workers) goes to stderr
+            stack.enter_context(redirect_stdout(sys.stderr))
+
+        if jobs > 1:
+            frames_used = _decode_parallel(src_images, outfile, jobs, dark, ecc, fountain, force_preprocess,
+                                           color_correct, deskew, auto_dewarp, deskew_jobs, cv_threads,
+                                           skip_duplicates, dictionaries, unpack)
+        else:
+            frames_used = _decode_serial(src_images, outfile, dark, ecc, fountain, force_preprocess, color_correct,
+                                         deskew, auto_dewarp, skip_duplicates, dictionaries, unpack)
 
+        if fountain:
+            print(f'used {frames_used} frames')
+    return frames_used
 
+
+def _bitmap(name):
+    return Image.open(path.join(CIMBAR_ROOT, 'bitmap', name))
+
+
+@lru_cache(maxsize=None)
 def _get_image_template(width, dark):
+    '''
+    the background for every frame: anchors and guides. Built once per (width, dark).
+    returns a read-only array -- copy it before drawing on it.
+    '''
     color = (0, 0, 0) if dark else (255, 255, 255)
     img = Image.new('RGB', (width, width), color=color)
 
     suffix = 'dark' if dark else 'light'
-    anchor = Image.open(f'bitmap/anchor-{suffix}.png')
-    anchor_br = Image.open(f'bitmap/anchor-secondary-{suffix}.png')
+    anchor = _bitmap(f'anchor-{suffix}.png')
+    anchor_br = _bitmap(f'anchor-secondary-{suffix}.png')
     aw, ah = anchor.size
     img.paste(anchor, (0, 0))
     img.paste(anchor, (0, width-ah))
     img.paste(anchor, (width-aw, 0))
     img.paste(anchor_br, (width-aw, width-ah))
 
-    horizontal_guide = Image.open(f'bitmap/guide-horizontal-{suffix}.png')
+    horizontal_guide = _bitmap(f'guide-horizontal-{suffix}.png')
     gw, _ = horizontal_guide.size
     img.paste(horizontal_guide, (width//2 - gw//2, 2))
     img.paste(horizontal_guide, (width//2 - gw//2, width-4))
     img.paste(horizontal_guide, (width//2 - gw - gw//2, width-4))  # long bottom guide
     img.paste(horizontal_guide, (width//2 + gw - gw//2, width-4))  # ''
 
-    vertical_guide = Image.open(f'bitmap/guide-vertical-{suffix}.png')
+    vertical_guide = _bitmap(f'guide-vertical-{suffix}.png')
     _, gh = vertical_guide.size
     img.paste(vertical_guide, (2, width//2 - gw//2))
     img.paste(vertical_guide, (width-4, width//2 - gw//2))
-    return img
+
+    template = numpy.array(img)
+    template.flags.writeable = False
+    return template
 
 
-def _get_encoder_stream(src, ecc, fountain, compression_level=16):
+def _get_encoder_stream(src, ecc, fountain, compression_level=16, compression_threads=None, dictionary=None,
+                        segment_size=None):
     # various checks to set up the instream.
     # the hierarchy is raw bytes -> zstd -> fountain -> reedsolomon -> image
-    f = open(src, 'rb')
+    f = pack_reader(src) if isinstance(src, (list, tuple)) else _open(src, 'rb')
+    reader = None
     if fountain:
-        import zstandard as zstd
-        from cimbar.fountain.fountain_encoder_stream import fountain_encoder_stream
-        reader = zstd.ZstdCompressor(level=compression_level).stream_reader(f)
-        f = fountain_encoder_stream(reader, _fountain_chunk_size(ecc))
-    estream = reed_solomon_stream(f, ecc, conf.ECC_BLOCK_SIZE) if ecc else f
+        from cimbar.util.compression import choose_params, compressing_reader, load_dictionary
+        dict_data = load_dictionary(dictionary) if dictionary else None
+        params = choose_params(f, compression_level, compression_threads, dict_data)
+        reader = compressing_reader(f, *params, dict_data=dict_data)
+        if fountain == 'segmented':
+            from cimbar.fountain.segmented_encoder_stream import segmented_encoder_stream
+            f = segmented_encoder_stream(reader, _fountain_chunk_size(ecc), segment_size)
+        else:
+            from cimbar.fountain.fountain_encoder_stream import fountain_encoder_stream
+            f = fountain_encoder_stream(reader, _fountain_chunk_size(ecc))
+    estream = _ecc_stream(f, ecc, conf.ECC_BLOCK_SIZE) if ecc else f
 
     read_size = _fountain_chunk_size(ecc) if fountain else 16384
-    read_count = (f.len // read_size) * 2 if fountain else 1
+    if fountain == 'segmented':
+        read_count = float('inf')  # we won't know the size until we get there. Read until the stream runs dry
+    else:
+        read_count = (f.len // read_size) * 2 if fountain else 1
     params = {
         'read_size': read_size,
         'read_count': read_count,
     }
-    return estream, params
+    return estream, f, params, reader
+
+
+def _ecc_size(num_bytes, ecc):
+    ''' how big num_bytes of input will be after the ecc '''
+    if not ecc:
+        return num_bytes
+    full, partial = divmod(num_bytes, conf.ECC_BLOCK_SIZE - ecc)
+    return full * conf.ECC_BLOCK_SIZE + (partial + ecc if partial else 0)
+
+
+def _chunks_per_frame(read_size, ecc):
+    '''
+    how many (ecc'd) fountain chunks make up exactly one frame.
+    None if frames don't start on chunk boundaries -- or if values would straddle chunks, which bit_file truncates.
+    '''
+    chunk_bits = _ecc_size(read_size, ecc) * 8
+    frame_bits = num_cells() * bits_per_op()
+    value_bits = [conf.BITS_PER_SYMBOL, BITS_PER_COLOR] if use_split_mode() else [bits_per_op()]
+    if frame_bits % chunk_bits or any(chunk_bits % b for b in value_bits):
+        return None
+    return frame_bits // chunk_bits
+
+
+def _layout_params():
+    return (
+        conf.CELL_SPACING_X, conf.CELL_SPACING_Y, conf.CELL_DIM_X, conf.CELL_DIM_Y, conf.CELLS_OFFSET,
+        conf.MARKER_SIZE_X, conf.MARKER_SIZE_Y, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS
+    )
 
 
-def encode_iter(src_data, ecc, fountain):
-    estream, params = _get_encoder_stream(src_data, ecc, fountain)
-    with estream as instream, bit_file(instream, bits_per_op=bits_per_op(), **params) as f:
-        frame_num = 0
-        while f.read_count > 0:
-            cells, _ = cell_positions(conf.CELL_SPACING_X, conf.CELL_SPACING_Y, conf.CELL_DIM_X, conf.CELL_DIM_Y,
-                                      conf.CELLS_OFFSET, conf.MARKER_SIZE_X, conf.MARKER_SIZE_Y)
-            assert len(cells) == num_cells()
+@lru_cache(maxsize=None)
+def _interleaved_cell_positions(spacing_x, spacing_y, dim_x, dim_y, offset, marker_size_x, marker_size_y,
+                                interleave_blocks, interleave_partitions):
+    cells, _ = cell_positions(spacing_x, spacing_y, dim_x, dim_y, offset, marker_size_x, marker_size_y)
+    positions = numpy.array(list(interleave(cells, interleave_blocks, interleave_partitions)), dtype=numpy.intp)
+    positions.flags.writeable = False
+    return positions
 
-            if use_split_mode():
-                symbols = []
-                for x, y in interleave(cells, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS):
-                    bits = f.read(conf.BITS_PER_SYMBOL)
-                    symbols.append(bits)
 
-                # there are better ways to do this than reverse+pop...
-                # the important part is that it's a 2-pass approach
-                symbols.reverse()
+@lru_cache(maxsize=None)
+def _deinterleave_order(spacing_x, spacing_y, dim_x, dim_y, offset, marker_size_x, marker_size_y,
+                        interleave_blocks, interleave_partitions):
+    cells, _ = cell_positions(spacing_x, spacing_y, dim_x, dim_y, offset, marker_size_x, marker_size_y)
+    order = interleave_permutation(cells, interleave_blocks, interleave_partitions)
+    order.flags.writeable = False
+    return order
+
+
+def interleaved_cell_positions():
+    ''' (x, y) for every cell, in the order the encoder writes them. Cached per config. '''
+    return _interleaved_cell_positions(*_layout_params())
+
+
+def deinterleave_order():
+    ''' gathers decoded cell values (indexed by cell position) back into stream order. Cached per config. '''
+    return _deinterleave_order(*_layout_params())
+
 
-                for x, y in interleave(cells, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS):
-                    bits = symbols.pop() | (f.read(BITS_PER_COLOR) << conf.BITS_PER_SYMBOL)
-                    yield bits, x, y, frame_num
+def encode_frames(src_data, ecc, fountain, start=0, stop=None, compression_level=16, compression_threads=None,
+                  dictionary=None, segment_size=None):
+    '''
+    yields (frame_num, values) for frames start..stop-1, or start..the end if stop is None.
+    values is one array of per-cell values per frame, aligned with interleaved_cell_positions().
+    fountain encodes are zstd compressed first. compression_level is lowered for inputs that won't compress,
+    and compression_threads=None is one thread per cpu for large inputs.
+    dictionary is a trained zstd dictionary file. The decoder will need it too.
+    segment_size is for segmented fountain encodes: bytes of (compressed) input per segment. None is the default.
+
+    a fountain encode can start anywhere: the fountain stream jumps straight to the first chunk of frame `start`,
+    so the frames before it are never generated. (When the config's frames don't line up with its chunks,
+    for segmented fountain encodes, or without fountain encoding, the earlier frames are still generated and
+    thrown away -- but not rendered.)
+    '''
+    estream, fstream, params, compressor = _get_encoder_stream(
+        src_data, ecc, fountain, compression_level, compression_threads, dictionary, segment_size
+    )
+    frame_num = 0
+    chunks = _chunks_per_frame(params['read_size'], ecc) if fountain else None
+    if start and chunks and hasattr(fstream, 'seek'):
+        skip = min(start * chunks, params['read_count'])
+        fstream.seek(skip)
+        params['read_count'] -= skip
+        frame_num = start
+
+    with estream as instream, bit_file(instream, bits_per_op=bits_per_op(), **params) as f:
+        ncells = num_cells()
+        while f.read_count > 0 and not f.eof() and (stop is None or frame_num < stop):
+            if use_split_mode():
+                # it's a 2-pass approach: all the symbol bits for the frame, then all the color bits
+                symbols = f.read_array(ncells, conf.BITS_PER_SYMBOL)
+                colors = f.read_array(ncells, BITS_PER_COLOR)
+                values = symbols | (colors << conf.BITS_PER_SYMBOL)
 
             else:
-                for x, y in interleave(cells, conf.INTERLEAVE_BLOCKS, conf.INTERLEAVE_PARTITIONS):
-                    bits = f.read()
-                    yield bits, x, y, frame_num
+                values = f.read_array(ncells)
 
+            if frame_num >= start:
+                yield frame_num, values
             frame_num += 1
-        print(f'encoded {frame_num} frames')
+        # stderr, so it doesn't end up in a frame stream on stdout
+        if compressor:
+            print(compressor.report(), file=sys.stderr)
+        print(f'encoded {frame_num - start} frames', file=sys.stderr)
 
 
-def encode(src_data, dst_image, dark=False, ecc=conf.ECC, fountain=False):
-    def save_frame(img, frame):
-        if img:
-            name = dst_image if not frame else f'{dst_image}.{frame}.png'
-            img.save(name)
+def encode_frame_iter(src_data, ecc, fountain):
+    ''' yields one array of per-cell values per frame, aligned with interleaved_cell_positions() '''
+    for _, values in encode_frames(src_data, ecc, fountain):
+        yield values
 
-    img = None
-    frame = None
-    ct = CimbEncoder(dark, symbol_bits=conf.BITS_PER_SYMBOL, color_bits=BITS_PER_COLOR)
-    for bits, x, y, frame_num in encode_iter(src_data, ecc, fountain):
-        if frame != frame_num:  # save
-            save_frame(img, frame)
-            img = _get_image_template(conf.TOTAL_SIZE, dark)
-            frame = frame_num
 
-        encoded = ct.encode(bits)
-        img.paste(encoded, (x, y))
-    save_frame(img, frame)
+def encode_iter(src_data, ecc, fountain):
+    positions = interleaved_cell_positions()
+    assert len(positions) == num_cells()
+    for frame_num, values in enumerate(encode_frame_iter(src_data, ecc, fountain)):
+        for bits, (x, y) in zip(values, positions):
+            yield int(bits), int(x), int(y), frame_num
+
+
+@lru_cache(maxsize=None)
+def _get_encoder(dark, symbol_bits, color_bits):
+    return CimbEncoder(dark, symbol_bits=symbol_bits, color_bits=color_bits)
+
+
+@lru_cache(maxsize=None)
+def _get_palette(width, dark, symbol_bits, color_bits):
+    '''
+    a frame only has a handful of colors. So for pngs we draw palette indices instead of RGB:
+    returns (palette, the tile atlas as indices, the image template as indices)
+    '''
+    ct = _get_encoder(dark, symbol_bits, color_bits)
+    palette, (atlas, template) = palettize(ct.atlas, _get_image_template(width, dark))
+    template.flags.writeable = False
+    return palette, atlas, template
+
+
+def _render_frame(values, dark):
+    ct = _get_encoder(dark, conf.BITS_PER_SYMBOL, BITS_PER_COLOR)
+    frame = _get_image_template(conf.TOTAL_SIZE, dark).copy()
+    return ct.render(frame, interleaved_cell_positions(), values)
+
+
+def _render_png(values, dark):
+    ''' an indexed (mode P) png. Several times smaller -- and faster to save and load -- than an RGB one '''
+    ct = _get_encoder(dark, conf.BITS_PER_SYMBOL, BITS_PER_COLOR)
+    palette, atlas, template = _get_palette(conf.TOTAL_SIZE, dark, conf.BITS_PER_SYMBOL, BITS_PER_COLOR)
+    frame = ct.render(template.copy(), interleaved_cell_positions(), values, atlas)
+
+    img = Image.fromarray(frame)
+    img.putpalette(palette.tobytes())
+    buff = BytesIO()
+    img.save(buff, format='PNG')
+    return buff.getvalue()
+
+
+def _encode_frame_job(args):
+    ''' render (and png compress, if the output wants it) one frame in a worker process '''
+    frame_num, values, dark, as_png = args
+    return frame_num, _render_png(values, dark) if as_png else _render_frame(values, dark)
+
+
+def _frame_name(dst_image, frame_num):
+    return dst_image if not frame_num else f'{dst_image}.{frame_num}.png'
+
+
+class _png_file_writer:
+    ''' one png per frame, named by _frame_name() '''
+    takes_png = True
+
+    def __init__(self, dst_image):
+        self.dst_image = dst_image
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def write(self, frame_num, png):
+        with open(_frame_name(self.dst_image, frame_num), 'wb') as f:
+            f.write(png)
+
+
+def _frame_writer(dst_image, fps):
+    ''' where the frames go depends on the output name: an .apng, a video, raw rgb24 to stdout ("-"), or pngs '''
+    if dst_image == '-':
+        return raw_writer(dst_image)
+    ext = path.splitext(dst_image)[1].lower()
+    if ext in APNG_EXTENSIONS:
+        return apng_writer(dst_image, fps)
+    if is_video(dst_image):
+        return video_writer(dst_image, fps)
+    return _png_file_writer(dst_image)
+
+
+def _encode_parallel(frames, writer, dark, jobs):
+    '''
+    a pipeline: zstd -> fountain -> ecc -> bit_file (one thread) -> render (+ png) (a pool of `jobs` processes)
+    -> writer (here). Frames come back in order.
+    '''
+    from multiprocessing import Pool
+
+    with Pool(jobs, initializer=_init_worker, initargs=_worker_params()) as pool:
+        def render(frame):
+            frame_num, values = frame
+            return pool.apply(_encode_frame_job, ((frame_num, values, dark, writer.takes_png),))
+
+        rendered = pipeline(frames, [stage(render, jobs)], queue_size=jobs)
+        with closing(rendered):
+            for frame_num, data in rendered:
+                writer.write(frame_num, data)
+
+
+def encode(src_data, dst_image, dark=False, ecc=conf.ECC, fountain=False, jobs=1, start=0, stop=None, fps=15,
+           compression_level=16, compression_threads=None, dictionary=None, segment_size=None):
+    '''
+    src_data is a file ("-" is stdin), or a list of files and directories to pack into one encode.
+    a plain fountain encode holds all of its (compressed) input in memory.
+    A segmented one only needs a segment at a time, so it's the one to use for big streams. segment_size sets how big.
+    start and stop select a range of frames, e.g. to shard an encode. Frames are named for their absolute frame number.
+    dst_image can also be an .apng or a lossless video (.mkv, .avi) playing at `fps`,
+    or "-" for a raw rgb24 frame stream on stdout.
+    '''
+    frames = encode_frames(
+        src_data, ecc, fountain, start, stop, compression_level, compression_threads, dictionary, segment_size
+    )
+    with _frame_writer(dst_image, fps) as writer:
+        if jobs > 1:
+            return _encode_parallel(frames, writer, dark, jobs)
+
+        for frame_num, values in frames:
+            writer.write(frame_num, _render_png(values, dark) if writer.takes_png else _render_frame(values, dark))
+
+
+def _parse_frame_range(frames):
+    ''' "5" is frame 5 alone. "5:10" is 5-9. Either end can be left off '''
+    if not frames:
+        return 0, None
+    if ':' not in frames:
+        return int(frames), int(frames) + 1
+    start, stop = frames.split(':')
+    return int(start or 0), int(stop) if stop else None
 
 
 def main():
@@ -562,19 +1234,41 @@ def main():
     except:
         ecc = conf.ECC
     fountain = bool(args.get('--fountain'))
+    if args.get('--segmented'):
+        fountain = 'segmented'
+    jobs = int(args.get('--jobs'))
 
     if args['--encode']:
-        src_data = args['<src_data>'] or args['--src_data']
+        src_data = args['<FILES>'] if args['--pack'] else args['<src_data>'] or args['--src_data']
         dst_image = args['<output>'] or args['--output']
-        encode(src_data, dst_image, dark, ecc, fountain)
+        start, stop = _parse_frame_range(args.get('--frames'))
+        fps = float(args.get('--fps'))
+        compression_level = int(args.get('--zstd-level'))
+        try:
+            compression_threads = int(args.get('--zstd-threads'))
+        except:
+            compression_threads = None
+        dictionary = args['--dictionary'][0] if args['--dictionary'] else None
+        segment_size = int(args['--segment-size']) if args.get('--segment-size') else None
+        encode(src_data, dst_image, dark, ecc, fountain, jobs, start, stop, fps, compression_level, compression_threads,
+               dictionary, segment_size)
         return
 
     deskew = get_deskew_params(args.get('--deskew'))
     should_preprocess = int(args.get('--preprocess'))
     color_correct = int(args.get('--color-correct'))
-    src_images = args['<IMAGES>']
+    stride = int(args.get('--stride'))
+    raw_size = parse_frame_size(args['--raw-size']) if args.get('--raw-size') else None
+    src_images = frame_sources(args['<IMAGES>'], stride, raw_size)
     dst_data = args['<output>'] or args['--output']
-    decode(src_images, dst_data, dark, ecc, fountain, should_preprocess, color_correct, **deskew)
+    try:
+        deskew_jobs = int(args.get('--deskew-jobs'))
+    except:
+        deskew_jobs = None
+    cv_threads = int(args.get('--cv-threads'))
+    decode(src_images, dst_data, dark, ecc, fountain, should_preprocess, color_correct, jobs=jobs,
+           deskew_jobs=deskew_jobs, cv_threads=cv_threads, dictionaries=args['--dictionary'], unpack=args['--unpack'],
+           **deskew)
 
 
 if __name__ == '__main__':
@@ -42,6 +42,28 @@ class sq8x8:
     MARKER_SIZE_Y = round(54 / CELL_SPACING_Y)  # 6 or 9, probably
 
 
+# sq8x8, but with bit-level soft decision ecc (LDPC) instead of reed solomon. Same overhead.
+class sq8x8ldpc:
+    TOTAL_SIZE = 1024
+    BITS_PER_SYMBOL = 4
+    BITS_PER_COLOR = 2
+    CELL_SIZE = 8
+    CELL_SPACING_X = CELL_SIZE + 1
+    CELL_DIM_X = 112
+    CELLS_OFFSET = 8
+    ECC = 30
+    ECC_BLOCK_SIZE = 155
+    ECC_MODE = 'ldpc'
+    INTERLEAVE_PARTITIONS = 2
+    FOUNTAIN_BLOCKS = 0  # dynamic
+
+    CELL_DIM_Y = CELL_DIM_X
+    CELL_SPACING_Y = CELL_SPACING_X
+    INTERLEAVE_BLOCKS = ECC_BLOCK_SIZE
+    MARKER_SIZE_X = round(54 / CELL_SPACING_X)
+    MARKER_SIZE_Y = round(54 / CELL_SPACING_Y)  # 6 or 9, probably
+
+
 class sq5x5:
     TOTAL_SIZE = 988
     BITS_PER_SYMBOL = 2
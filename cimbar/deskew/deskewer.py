@@ -92,10 +92,10 @@ def scan(img, dark, use_edges, size, anchor_size):
     return align
 
 
-def deskewer(src_image, dst_image, dark, use_edges=True, auto_dewarp=True, anchor_size=ANCHOR_SIZE):
+def deskew_image(img, dark, use_edges=True, auto_dewarp=True, anchor_size=ANCHOR_SIZE):
+    ''' img is a (BGR) numpy array. Returns the deskewed image, or None if we couldn't find the anchors. '''
     size = conf.TOTAL_SIZE
 
-    img = cv2.imread(src_image)
     align = scan(img, dark, use_edges, size, anchor_size)
     if not align:
         print('didnt detect enough points! :(')
@@ -112,6 +112,14 @@ def deskewer(src_image, dst_image, dark, use_edges=True, auto_dewarp=True, ancho
         (size-anchor_size, size-anchor_size), (anchor_size, size-anchor_size)
     ]
 
-    out = correct_perspective(img, (size, size), input_pts, output_pts)
+    return correct_perspective(img, (size, size), input_pts, output_pts)
+
+
+def deskewer(src_image, dst_image, dark, use_edges=True, auto_dewarp=True, anchor_size=ANCHOR_SIZE):
+    img = cv2.imread(src_image)
+    out = deskew_image(img, dark, use_edges, auto_dewarp, anchor_size)
+    if out is None:
+        return None
+
     cv2.imwrite(dst_image, out)
     return img.shape[:2]
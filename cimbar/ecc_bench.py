@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+"""ecc_bench.py
+
+Compare reed solomon and LDPC error correction on simulated cimbar frames, at the same overhead.
+Symbol errors follow the (symbol hash distance -> error rate) profile measured on perspective-warped test images,
+and each decoder gets the same confidence information a real decode would give it.
+
+Usage:
+  ./ecc_bench.py [--frames=<n>] [--ecc=<0-150>] [--noise=<scale>...]
+  ./ecc_bench.py (-h | --help)
+
+Examples:
+  python -m cimbar.ecc_bench --frames=10 --noise=1 --noise=2 --noise=3
+
+Options:
+  -h --help                        Show this help.
+  --frames=<n>                     How many frames to simulate per noise level. [default: 5]
+  -e --ecc=<0-150>                 Error correction level. [default: 30]
+  --noise=<scale>                  Multiplier on the measured symbol error rates. [default: 1]
+"""
+import time
+from io import BytesIO
+
+import numpy
+from docopt import docopt
+
+from cimbar import conf
+from cimbar.cimbar import capacity, _symbol_llr
+from cimbar.encode.ldpc import ldpc_stream
+from cimbar.encode.rss import reed_solomon_stream
+from cimbar.util.bit_file import pack_uints, unpack_uints
+
+
+# from the warped test images: how often a cell lands in each distance bucket, and its error rate there
+DISTANCES = [2, 6, 9, 11, 13, 15, 18]
+DISTANCE_PROB = numpy.array([426, 4395, 3351, 2421, 1212, 454, 141]) / 12400
+ERROR_RATE = numpy.array([0, 0.0003, 0.008, 0.04, 0.094, 0.1, 0.24])
+
+
+def _noisy_symbols(symbols, noise, rng):
+    bucket = rng.choice(len(DISTANCES), size=len(symbols), p=DISTANCE_PROB)
+    distance = numpy.array(DISTANCES)[bucket]
+    wrong = rng.random(len(symbols)) < numpy.minimum(ERROR_RATE[bucket] * noise, 1)
+    # a wrong symbol is any of the others
+    offset = rng.integers(1, 2 ** conf.BITS_PER_SYMBOL, size=len(symbols))
+    noisy = numpy.where(wrong, (symbols + offset) % 2 ** conf.BITS_PER_SYMBOL, symbols)
+    return noisy, distance
+
+
+def _run(stream_class, payload, ecc, noise, rng):
+    encoded = stream_class(BytesIO(payload), ecc, conf.ECC_BLOCK_SIZE).read(len(payload))
+
+    # we only simulate the symbol pass. Color errors are much rarer.
+    symbol_bytes = len(encoded) * conf.BITS_PER_SYMBOL // (conf.BITS_PER_SYMBOL + conf.BITS_PER_COLOR)
+    symbols = unpack_uints(encoded[:symbol_bytes], conf.BITS_PER_SYMBOL)
+    noisy, distance = _noisy_symbols(symbols, noise, rng)
+    buff = pack_uints(noisy, conf.BITS_PER_SYMBOL)
+
+    outbuff = BytesIO()
+    decoder = stream_class(outbuff, ecc, conf.ECC_BLOCK_SIZE, mode='write')
+    start = time.perf_counter()
+    if stream_class is reed_solomon_stream:
+        byte_distance = numpy.repeat(distance, conf.BITS_PER_SYMBOL).reshape(-1, 8).max(axis=1)
+        decoder.write(buff, byte_distance)
+    else:
+        decoder.write(buff, numpy.repeat(_symbol_llr(distance), conf.BITS_PER_SYMBOL))
+    elapsed = time.perf_counter() - start
+
+    # how much of the symbol pass payload made it through intact
+    msg_size = conf.ECC_BLOCK_SIZE - ecc
+    expected = payload[:len(buff) // conf.ECC_BLOCK_SIZE * msg_size]
+    decoded = outbuff.getvalue()
+    recovered = sum(
+        msg_size for i in range(0, len(expected), msg_size) if decoded[i:i+msg_size] == expected[i:i+msg_size]
+    )
+    return elapsed, recovered, len(expected), numpy.mean(noisy != symbols)
+
+
+def benchmark(frames, ecc, noise_levels):
+    rng = numpy.random.default_rng(0)
+    payload_size = capacity() * (conf.ECC_BLOCK_SIZE - ecc) // conf.ECC_BLOCK_SIZE
+    for noise in noise_levels:
+        for name, stream_class in [('reed_solomon', reed_solomon_stream), ('ldpc', ldpc_stream)]:
+            total_time = total_recovered = total_payload = 0
+            cell_errors = []
+            for _ in range(frames):
+                payload = rng.integers(0, 256, payload_size, dtype=numpy.uint8).tobytes()
+                elapsed, recovered, expected, err = _run(stream_class, payload, ecc, noise, rng)
+                total_time += elapsed
+                total_recovered += recovered
+                total_payload += expected
+                cell_errors.append(err)
+
+            print(
+                f'noise={noise} {name:>12}: cell error rate {numpy.mean(cell_errors):.4f}, '
+                f'{frames / total_time:.1f} frames/sec (symbol pass ecc decode), '
+                f'recovered {total_recovered // frames}/{total_payload // frames} bytes per frame'
+            )
+
+
+def main():
+    args = docopt(__doc__, version='cimbar ecc benchmark 0.0.1')
+    frames = int(args['--frames'])
+    ecc = int(args['--ecc'])
+    noise_levels = [float(n) for n in args['--noise']]
+    benchmark(frames, ecc, noise_levels)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
-from os import path
+from functools import lru_cache
+from hashlib import sha1
+from os import environ, makedirs, path, replace
+from tempfile import NamedTemporaryFile
 
 import numpy
 import imagehash
@@ -6,6 +9,7 @@ from PIL import Image
 
 
 CIMBAR_ROOT = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..', '..'))
+CACHE_DIR = environ.get('CIMBAR_CACHE_DIR', path.join(path.expanduser('~'), '.cache', 'cimbar'))
 DEFAULT_COLOR_CORRECT = {'r_min': 0, 'r_max': 255.0, 'g_min': 0, 'g_max': 255.0, 'b_min': 0, 'b_max': 255.0}
 
 
@@ -62,6 +66,89 @@ def load_tile(name, dark, replacements={}):
     return img
 
 
+def _tile_path(symbol_bits, i):
+    return path.join(CIMBAR_ROOT, 'bitmap', f'{symbol_bits}', f'{i:02x}.png')
+
+
+def load_tile_array(name, dark, color):
+    '''
+    numpy equivalent of load_tile(), for the encoder's replacements.
+    returns an (h, w, 3) uint8 array.
+    '''
+    tile = numpy.array(Image.open(name).convert('RGBA'))
+    res = tile[..., :3].copy()
+    res[(tile == (0, 255, 255, 255)).all(axis=-1)] = color
+    if dark:
+        res[(tile == (255, 255, 255, 255)).all(axis=-1)] = (0, 0, 0)
+    return res
+
+
+def _atlas_cache_path(cache_dir, symbol_bits, colors, dark):
+    # key on the tile contents too, so edits to bitmap/ invalidate the cache
+    h = sha1(f'{symbol_bits}|{colors}|{dark}'.encode())
+    for i in range(2 ** symbol_bits):
+        with open(_tile_path(symbol_bits, i), 'rb') as f:
+            h.update(f.read())
+    suffix = 'dark' if dark else 'light'
+    return path.join(cache_dir, f'atlas-{symbol_bits}-{len(colors)}-{suffix}-{h.hexdigest()[:16]}.npy')
+
+
+def _build_tile_atlas(dark, symbol_bits, colors):
+    num_symbols = 2 ** symbol_bits
+    tiles = [load_tile_array(_tile_path(symbol_bits, i), dark, color) for color in colors for i in range(num_symbols)]
+    return numpy.stack(tiles)
+
+
+def _save_tile_atlas(cache_path, atlas):
+    try:
+        makedirs(path.dirname(cache_path), exist_ok=True)
+        with NamedTemporaryFile(dir=path.dirname(cache_path), suffix='.npy', delete=False) as f:
+            numpy.save(f, atlas)
+        replace(f.name, cache_path)
+    except OSError:  # the cache is an optimization. If we can't write it, carry on.
+        pass
+
+
+@lru_cache(maxsize=None)
+def tile_atlas(dark, symbol_bits, color_bits=0, cache_dir=None):
+    '''
+    all encoder tiles, pre-rendered into one uint8 array of shape (2^(symbol_bits+color_bits), h, w, 3).
+    index is `color * 2^symbol_bits + symbol`, same as the bits passed to CimbEncoder.encode().
+    persisted to disk (CIMBAR_CACHE_DIR) so subsequent encoders don't re-render the tileset.
+    '''
+    colors = possible_colors(dark, color_bits)
+    cache_path = _atlas_cache_path(cache_dir or CACHE_DIR, symbol_bits, colors, dark)
+    try:
+        atlas = numpy.load(cache_path)
+    except (OSError, ValueError):
+        atlas = _build_tile_atlas(dark, symbol_bits, colors)
+        _save_tile_atlas(cache_path, atlas)
+    atlas.flags.writeable = False
+    return atlas
+
+
+def palettize(*imgs):
+    '''
+    map some RGB uint8 arrays (of any shape ending in 3) onto one shared palette.
+    returns the palette, an (n, 3) uint8 array, and a list of same-shaped uint8 index arrays, one per input.
+    '''
+    # pack each pixel into one int so the unique is 1D -- much faster than unique(axis=0)
+    packed = [
+        img[..., 0].astype(numpy.uint32) << 16 | img[..., 1].astype(numpy.uint32) << 8 | img[..., 2] for img in imgs
+    ]
+    colors, inverse = numpy.unique(numpy.concatenate([p.ravel() for p in packed]), return_inverse=True)
+    if len(colors) > 256:
+        raise Exception(f'too many colors to palettize: {len(colors)}')
+
+    palette = numpy.stack([colors >> 16, colors >> 8, colors], axis=-1).astype(numpy.uint8)
+    indices = []
+    pos = 0
+    for p in packed:
+        indices.append(inverse[pos:pos+p.size].reshape(p.shape).astype(numpy.uint8))
+        pos += p.size
+    return palette, indices
+
+
 def avg_color(img, dark):
     nim = numpy.array(img)
     w,h,d = nim.shape
@@ -105,8 +192,7 @@ class CimbDecoder:
         self.color_clusters = None
 
         for i in range(2 ** symbol_bits):
-            name = path.join(CIMBAR_ROOT, 'bitmap', f'{symbol_bits}', f'{i:02x}.png')
-            img = load_tile(name, self.dark)
+            img = load_tile(_tile_path(symbol_bits, i), self.dark)
             ahash = imagehash.average_hash(img)
             self.hashes[i] = ahash
 
@@ -180,6 +266,10 @@ class CimbDecoder:
             self.color_metrics[i] = (real_distance, color_in)
 
     def best_color(self, r, g, b, sector):
+        return self.best_color_distance(r, g, b, sector)[0]
+
+    def best_color_distance(self, r, g, b, sector):
+        ''' returns (best fit, distance to that palette color). Lower distance is better. '''
         r, g, b = self._correct_all_colors(r, g, b, sector)
         #print(f'{r} {g} {b}')
 
@@ -189,7 +279,7 @@ class CimbDecoder:
         color_in = (r, g, b)
         self.color_metrics.append(color_in)
         if self.color_clusters:
-            return self.color_clusters.categorize(color_in)
+            return self.color_clusters.categorize(color_in), 0
 
         best_fit = 0
         best_distance = 1000000
@@ -201,37 +291,36 @@ class CimbDecoder:
                 best_distance = diff
                 #if best_distance < 30:
                 #    break
-        return best_fit
+        return best_fit, best_distance
 
     def decode_color(self, img_cell, sector):
+        return self.decode_color_distance(img_cell, sector)[0]
+
+    def decode_color_distance(self, img_cell, sector):
         if len(self.colors) <= 1:
-            return 0
+            return 0, 0
 
         r, g, b = avg_color(img_cell, self.dark)
         # count colors?
-        return self.best_color(r, g, b, sector)
+        return self.best_color_distance(r, g, b, sector)
 
 
 class CimbEncoder:
     def __init__(self, dark, symbol_bits, color_bits=0):
-        self.img = {}
-        self.colors = {}
-
-        all_colors = possible_colors(dark, color_bits)
-        num_symbols = 2 ** symbol_bits
-        for c in range(2 ** color_bits):
-            color = all_colors[c]
-            for i in range(num_symbols):
-                name = path.join(CIMBAR_ROOT, 'bitmap', f'{symbol_bits}', f'{i:02x}.png')
-                self.img[c * num_symbols + i] = self._load_img(name, dark, color)
-
-    def _load_img(self, name, dark, color):
-        # replace by color...
-        replacements = {
-            (0, 255, 255, 255): color,
-        }
-        return load_tile(name, dark, replacements)
+        self.atlas = tile_atlas(dark, symbol_bits, color_bits)
 
     def encode(self, bits):
-        return self.img[bits]
-
+        return Image.fromarray(self.atlas[bits])
+
+    def render(self, frame, positions, values, atlas=None):
+        '''
+        draw every cell into `frame` (an (h, w, 3) uint8 array) in one shot.
+        positions is an (n, 2) array of top-left (x, y) coordinates, values is the n tile indices to draw there.
+        pass a palettize()d atlas to draw palette indices into an (h, w) frame instead.
+        '''
+        atlas = self.atlas if atlas is None else atlas
+        h, w = atlas.shape[1:3]
+        rows = positions[:, 1, None] + numpy.arange(h)
+        cols = positions[:, 0, None] + numpy.arange(w)
+        frame[rows[:, :, None], cols[:, None, :]] = atlas[values]
+        return frame
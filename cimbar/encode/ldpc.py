@@ -0,0 +1,213 @@
+from functools import lru_cache
+
+import numpy
+
+
+MAX_LLR = 20.0
+
+
+def _lcg(seed):
+    # tiny deterministic prng, so the parity check matrix never depends on the numpy version
+    x = seed
+    while True:
+        x = (x * 6364136223846793005 + 1442695040888963407) % 2**64
+        yield x >> 33
+
+
+@lru_cache(maxsize=None)
+def parity_check_edges(k, m, column_weight=4):
+    '''
+    an irregular repeat-accumulate style LDPC parity check matrix, H = [Hs | Hp], as a list of (row, col) edges.
+    Hs (m x k): column_weight ones per message bit, spread evenly over the rows.
+    Hp (m x m): dual-diagonal, so parity bits can be computed with a running xor.
+    '''
+    rand = _lcg(k * 1000003 + m)
+    sockets = [r % m for r in range(k * column_weight)]
+    for i in range(len(sockets) - 1, 0, -1):  # fisher-yates
+        j = next(rand) % (i + 1)
+        sockets[i], sockets[j] = sockets[j], sockets[i]
+
+    edges = set()
+    for col in range(k):
+        for row in sockets[col*column_weight:(col+1)*column_weight]:
+            edges.add((row, col))  # duplicates would cancel out anyway
+    for row in range(m):
+        edges.add((row, k + row))
+        if row > 0:
+            edges.add((row, k + row - 1))
+    edges = numpy.array(sorted(edges), dtype=numpy.int64)
+    edges.flags.writeable = False
+    return edges
+
+
+class LdpcCodec:
+    '''
+    systematic LDPC code with k message bits and m parity bits per block, decoded with normalized min-sum
+    belief propagation over every block of a frame at once.
+    codewords are laid out like reed solomon's: message bytes, then parity bytes.
+    '''
+    def __init__(self, ec_bytes, block_size, max_iterations=50, scale=0.75):
+        self.k = (block_size - ec_bytes) * 8
+        self.m = ec_bytes * 8
+        self.n = self.k + self.m
+        self.ec_bytes = ec_bytes
+        self.block_size = block_size
+        self.max_iterations = max_iterations
+        self.scale = scale
+
+        edges = parity_check_edges(self.k, self.m)
+        self.rows = edges[:, 0]
+        self.cols = edges[:, 1]
+        self.row_starts = numpy.flatnonzero(numpy.diff(self.rows, prepend=-1))
+        self.col_order = numpy.argsort(self.cols, kind='stable')
+        self.col_starts = numpy.flatnonzero(numpy.diff(self.cols[self.col_order], prepend=-1))
+
+        sys_edges = self.cols < self.k
+        self.hs = numpy.zeros((self.k, self.m), dtype=numpy.int32)
+        self.hs[self.cols[sys_edges], self.rows[sys_edges]] = 1
+
+    def _syndromes(self, bits):
+        # bits is (nblocks, n). returns (nblocks, m)
+        return numpy.bitwise_xor.reduceat(bits[:, self.cols], self.row_starts, axis=1)
+
+    def encode_blocks(self, msgs):
+        '''
+        msgs is an (nblocks, k // 8) uint8 array. Returns (nblocks, block_size) codewords.
+        '''
+        bits = numpy.unpackbits(msgs, axis=1).astype(numpy.int32)
+        accumulated = (bits @ self.hs) & 1
+        parity = numpy.bitwise_xor.accumulate(accumulated, axis=1).astype(numpy.uint8)
+        return numpy.concatenate((msgs, numpy.packbits(parity, axis=1)), axis=1)
+
+    def encode(self, data):
+        '''
+        split data into block_size-ec_bytes messages, and encode them all.
+        the last message may be short. It's encoded as if zero padded, but the padding isn't sent.
+        '''
+        chunk_size = self.block_size - self.ec_bytes
+        full = len(data) // chunk_size * chunk_size
+        res = b''
+        if full:
+            msgs = numpy.frombuffer(data[:full], dtype=numpy.uint8).reshape(-1, chunk_size)
+            res += self.encode_blocks(msgs).tobytes()
+        if full < len(data):
+            padded = numpy.zeros((1, chunk_size), dtype=numpy.uint8)
+            padded[0, :len(data) - full] = numpy.frombuffer(data[full:], dtype=numpy.uint8)
+            res += data[full:] + self.encode_blocks(padded)[0, chunk_size:].tobytes()
+        return res
+
+    def decode_llr(self, llr):
+        '''
+        llr is an (nblocks, n) float array: log(P(bit=0) / P(bit=1)) for every bit of every block.
+        returns (bits, ok): the hard decisions after belief propagation, and which blocks satisfied every check.
+        '''
+        bits = (llr < 0).astype(numpy.uint8)
+        ok = ~self._syndromes(bits).any(axis=1)
+        todo = numpy.flatnonzero(~ok)
+        if not len(todo):
+            return bits, ok
+
+        # only keep iterating on blocks that haven't converged yet
+        channel = llr[todo]
+        v2c = channel[:, self.cols]
+        for _ in range(self.max_iterations):
+            # check node update: sign product and min of everyone else
+            mag = numpy.abs(v2c)
+            neg = (v2c < 0).astype(numpy.int32)
+            sign_parity = numpy.add.reduceat(neg, self.row_starts, axis=1) & 1
+            min1 = numpy.minimum.reduceat(mag, self.row_starts, axis=1)[:, self.rows]
+            is_min = mag == min1
+            # the second smallest, for the edge that supplied the smallest
+            min2 = numpy.minimum.reduceat(numpy.where(is_min, numpy.inf, mag), self.row_starts, axis=1)[:, self.rows]
+            dupes = numpy.add.reduceat(is_min.astype(numpy.int32), self.row_starts, axis=1)[:, self.rows] > 1
+            others = numpy.where(is_min & ~dupes, min2, min1)
+            signs = 1 - 2 * (sign_parity[:, self.rows] ^ neg)
+            c2v = self.scale * signs * others
+
+            # variable node update
+            totals = channel + numpy.add.reduceat(c2v[:, self.col_order], self.col_starts, axis=1)
+            v2c = numpy.clip(totals[:, self.cols] - c2v, -MAX_LLR, MAX_LLR)
+
+            decided = (totals < 0).astype(numpy.uint8)
+            done = ~self._syndromes(decided).any(axis=1)
+            bits[todo[done]] = decided[done]
+            ok[todo[done]] = True
+            if done.all():
+                break
+            todo = todo[~done]
+            channel = channel[~done]
+            v2c = v2c[~done]
+
+        return bits, ok
+
+
+def bytes_to_llr(buffer, reliability=None):
+    ''' hard bytes (+ optional per-bit reliability magnitudes) -> per-bit llrs '''
+    bits = numpy.unpackbits(numpy.frombuffer(buffer, dtype=numpy.uint8))
+    mags = MAX_LLR / 2 if reliability is None else numpy.asarray(reliability, dtype=numpy.float64)
+    return (1 - 2 * bits.astype(numpy.float64)) * mags
+
+
+class ldpc_stream:
+    '''
+    drop-in alternative to reed_solomon_stream. Same block layout, same overhead (`ec` bytes of every `block_size`),
+    but corrects at the bit level, and can make use of soft information from the decoder.
+    '''
+    def __init__(self, f, ec, block_size, mode='read', on_failure=None):
+        if mode not in ['read', 'write']:
+            raise Exception('bad bit_file mode. Try "read" or "write"')
+        self.mode = mode
+        self.codec = LdpcCodec(ec, block_size)
+        self.block_size = block_size
+        self.msg_size = block_size - ec
+        self.empty_block = b'\0' * (block_size-ec) if on_failure is None else on_failure
+
+        if isinstance(f, str):
+            fmode = 'wb' if mode == 'write' else 'rb'
+            self.f = open(f, fmode)
+        else:
+            self.f = f
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if not self.f.closed:
+            with self.f:  # close file
+                pass
+
+    def write(self, buffer, reliability=None):
+        '''
+        reliability (optional) is a per-bit llr magnitude: how sure we are of each bit of buffer.
+        '''
+        llr = bytes_to_llr(buffer, reliability)
+        full = len(buffer) // self.block_size
+        blocks = llr[:full * self.block_size * 8].reshape(full, -1)
+        if full * self.block_size < len(buffer):
+            # short block: the message padding is known to be zero
+            tail = llr[full * self.block_size * 8:]
+            msg_bits = len(tail) - self.codec.m
+            padded = numpy.full(self.codec.n, MAX_LLR)
+            padded[:msg_bits] = tail[:msg_bits]
+            padded[self.codec.k:] = tail[msg_bits:]
+            blocks = numpy.concatenate((blocks, padded[None, :]))
+            sizes = [self.msg_size] * full + [max(0, msg_bits // 8)]
+        else:
+            sizes = [self.msg_size] * full
+
+        bits, ok = self.codec.decode_llr(blocks)
+        msgs = numpy.packbits(bits[:, :self.codec.k], axis=1)
+        for i, (msg, good, size) in enumerate(zip(msgs, ok, sizes)):
+            if not good:
+                print(f'failed decode at {i * self.block_size}')
+                self.f.write(self.empty_block)
+                continue
+            self.f.write(msg[:size].tobytes())
+
+    def read(self, max_bytes):
+        raw = self.f.read(max_bytes)
+        return self.codec.encode(raw)
@@ -0,0 +1,306 @@
+from functools import lru_cache
+
+import numpy
+
+
+class ReedSolomonError(Exception):
+    pass
+
+
+# syndromes held back from erasure-guessing corrections, to check the result against. See _correct_with_erasures()
+GMD_RESERVE = 2
+
+
+@lru_cache(maxsize=None)
+def gf_tables(prim=0x187, generator=2):
+    '''
+    log/antilog tables for GF(256). exp is doubled up to 510 entries so that exp[log[a] + log[b]] needs no modulo.
+    same field as reedsolo's init_tables(prim, generator).
+    '''
+    exp = numpy.zeros(512, dtype=numpy.int32)
+    log = numpy.zeros(256, dtype=numpy.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= prim
+    exp[255:510] = exp[:255]
+    exp.flags.writeable = False
+    log.flags.writeable = False
+    return exp, log
+
+
+@lru_cache(maxsize=None)
+def _syndrome_powers(nsym, fcr, n):
+    ''' log of alpha^((fcr+j) * (n-1-k)), for syndrome j and byte k '''
+    j = numpy.arange(nsym)[:, None] + fcr
+    k = numpy.arange(n - 1, -1, -1)[None, :]
+    powers = (j * k) % 255
+    powers.flags.writeable = False
+    return powers
+
+
+class ReedSolomonCodec:
+    '''
+    table-driven GF(256) reed solomon, meant to be bit-compatible with
+    reedsolo.RSCodec(nsym, nsize=nsize, fcr=fcr, prim=prim).
+
+    encoding is done for a whole frame's worth of blocks at once.
+    decode syndromes are also computed in bulk. Blocks with clean syndromes are passed
+    through as-is, and the slower Berlekamp-Massey/Forney path only runs for blocks that need it.
+    '''
+    def __init__(self, nsym, nsize=255, fcr=1, prim=0x187):
+        self.nsym = nsym
+        self.nsize = nsize
+        self.fcr = fcr
+        self.exp, self.log = gf_tables(prim)
+        # python lists are quicker than numpy for scalar lookups
+        self._exp = self.exp.tolist()
+        self._log = self.log.tolist()
+
+        # generator polynomial, high order first: prod(x - alpha^(fcr+i))
+        gen = [1]
+        for i in range(nsym):
+            gen = self._poly_mul(gen, [1, self._exp[(i + fcr) % 255]])
+        self.gen_log = self.log[numpy.array(gen[1:], dtype=numpy.int32)]
+
+    def _mul(self, a, b):
+        if a == 0 or b == 0:
+            return 0
+        return self._exp[self._log[a] + self._log[b]]
+
+    def _div(self, a, b):
+        if a == 0:
+            return 0
+        return self._exp[self._log[a] + 255 - self._log[b]]
+
+    def _poly_eval(self, poly, x):
+        ''' poly is low order first '''
+        y = 0
+        for c in reversed(poly):
+            y = self._mul(y, x) ^ c
+        return y
+
+    def _poly_mul(self, p, q):
+        res = [0] * (len(p) + len(q) - 1)
+        for i, a in enumerate(p):
+            for j, b in enumerate(q):
+                res[i+j] ^= self._mul(a, b)
+        return res
+
+    def encode_blocks(self, msgs):
+        '''
+        msgs is an (nblocks, k) uint8 array of messages, k <= nsize-nsym.
+        returns the (nblocks, k+nsym) systematic codewords: message, then parity.
+        '''
+        msgs = numpy.asarray(msgs, dtype=numpy.uint8)
+        parity = numpy.zeros((msgs.shape[0], self.nsym), dtype=numpy.int32)
+        # LFSR division by the generator, one message byte at a time -- but across every block at once
+        for col in msgs.T:
+            feedback = col ^ parity[:, 0]
+            parity[:, :-1] = parity[:, 1:]
+            parity[:, -1] = 0
+            nonzero = feedback != 0
+            parity[nonzero] ^= self.exp[self.log[feedback[nonzero]][:, None] + self.gen_log[None, :]]
+        return numpy.concatenate((msgs, parity.astype(numpy.uint8)), axis=1)
+
+    def encode(self, data):
+        '''
+        split data into nsize-nsym messages (the last may be shorter), and encode them all.
+        same result as RSCodec.encode().
+        '''
+        chunk_size = self.nsize - self.nsym
+        full = len(data) // chunk_size * chunk_size
+        res = b''
+        if full:
+            msgs = numpy.frombuffer(data[:full], dtype=numpy.uint8).reshape(-1, chunk_size)
+            res += self.encode_blocks(msgs).tobytes()
+        if full < len(data):
+            msgs = numpy.frombuffer(data[full:], dtype=numpy.uint8)[None, :]
+            res += self.encode_blocks(msgs).tobytes()
+        return res
+
+    def syndromes(self, blocks):
+        '''
+        blocks is an (nblocks, n) uint8 array of codewords.
+        returns an (nblocks, nsym) array. A block with all-zero syndromes has no (detectable) errors.
+        '''
+        blocks = numpy.asarray(blocks, dtype=numpy.uint8)
+        powers = _syndrome_powers(self.nsym, self.fcr, blocks.shape[1])
+        terms = self.exp[self.log[blocks][:, None, :] + powers[None, :, :]]
+        terms[numpy.broadcast_to((blocks == 0)[:, None, :], terms.shape)] = 0
+        return numpy.bitwise_xor.reduce(terms, axis=2)
+
+    def _forney_syndromes(self, synd, erase_pos, n):
+        # fold the known erasures out of the syndromes, so Berlekamp-Massey only has to find the unknown errors
+        fsynd = list(synd)
+        for p in erase_pos:
+            x = self._exp[n - 1 - p]
+            for j in range(len(fsynd) - 1):
+                fsynd[j] = self._mul(fsynd[j], x) ^ fsynd[j+1]
+            fsynd.pop()
+        return fsynd
+
+    def _berlekamp_massey(self, synd):
+        # returns the error locator, low order first
+        loc = [1]
+        prev = [1]
+        length = 0
+        shift = 1
+        prev_discrepancy = 1
+        for r, s in enumerate(synd):
+            d = s
+            for i in range(1, length + 1):
+                if i < len(loc):
+                    d ^= self._mul(loc[i], synd[r-i])
+            if d == 0:
+                shift += 1
+                continue
+
+            coef = self._div(d, prev_discrepancy)
+            update = [0] * shift + [self._mul(coef, c) for c in prev]
+            new_loc = loc + [0] * (len(update) - len(loc))
+            for i, c in enumerate(update):
+                new_loc[i] ^= c
+            if 2 * length <= r:
+                prev = loc
+                length = r + 1 - length
+                prev_discrepancy = d
+                shift = 1
+            else:
+                shift += 1
+            loc = new_loc
+
+        while len(loc) > 1 and loc[-1] == 0:
+            loc.pop()
+        return loc, length
+
+    def _chien_search(self, loc, n):
+        # indices into the block whose locator X = alpha^(n-1-i) satisfies loc(1/X) == 0
+        e = numpy.arange(n - 1, -1, -1)
+        vals = numpy.zeros(n, dtype=numpy.int32)
+        for k, c in enumerate(loc):
+            if c:
+                vals ^= self.exp[(self._log[c] - e * k) % 255]
+        return numpy.flatnonzero(vals == 0).tolist()
+
+    def correct(self, block, synd=None, erase_pos=(), reserve=0):
+        '''
+        correct a single codeword (errors and optional known erasures). Returns the corrected codeword as a bytearray,
+        or raises ReedSolomonError.
+        reserve is how many syndromes to hold back from the correction, so the final syndrome check still means
+        something -- with 2*errors + erasures == nsym, *any* block "corrects" to some codeword.
+        '''
+        block = bytearray(block)
+        n = len(block)
+        erase_pos = sorted(set(erase_pos))
+        budget = self.nsym - reserve
+        if len(erase_pos) > budget:
+            raise ReedSolomonError('too many erasures')
+        if synd is None:
+            synd = self.syndromes(numpy.frombuffer(bytes(block), dtype=numpy.uint8)[None, :])[0]
+        synd = [int(s) for s in synd]
+        if not any(synd):
+            return block
+
+        # erasure locator: prod(1 - X_e x)
+        erase_loc = [1]
+        for p in erase_pos:
+            erase_loc = self._poly_mul(erase_loc, [1, self._exp[n - 1 - p]])
+
+        err_loc, num_errors = self._berlekamp_massey(self._forney_syndromes(synd, erase_pos, n))
+        if 2 * num_errors + len(erase_pos) > budget:
+            raise ReedSolomonError('too many errors')
+        err_pos = self._chien_search(err_loc, n)
+        if len(err_pos) != len(err_loc) - 1:
+            raise ReedSolomonError('could not locate errors')
+
+        # Forney: magnitudes for errors and erasures together
+        errata_loc = self._poly_mul(erase_loc, err_loc)
+        evaluator = self._poly_mul(synd, errata_loc)[:self.nsym]
+        derivative = [c if i % 2 else 0 for i, c in enumerate(errata_loc)][1:]
+        for p in sorted(set(erase_pos + err_pos)):
+            x = self._exp[n - 1 - p]
+            x_inv = self._exp[255 - (n - 1 - p)]
+            denom = self._poly_eval(derivative, x_inv)
+            if denom == 0:
+                raise ReedSolomonError('could not correct errors')
+            mag = self._div(self._poly_eval(evaluator, x_inv), denom)
+            if self.fcr != 1:
+                mag = self._mul(mag, self._exp[((1 - self.fcr) * self._log[x]) % 255])
+            block[p] ^= mag
+
+        if self.syndromes(numpy.frombuffer(bytes(block), dtype=numpy.uint8)[None, :]).any():
+            raise ReedSolomonError('could not correct errors')
+        return block
+
+    def _correct_with_erasures(self, block, synd, distance):
+        '''
+        generalized minimum distance decoding: retry with the least reliable bytes (highest `distance`) marked as
+        erasures, 2 more at a time. An erasure costs half as much of the ecc budget as an unknown error.
+        we keep GMD_RESERVE syndromes out of every attempt: guessing erasures gives us many tries at each block,
+        and without spare redundancy to check against, an uncorrectable block would eventually "correct" to garbage.
+        '''
+        candidates = numpy.argsort(-numpy.asarray(distance), kind='stable')
+        candidates = candidates[numpy.asarray(distance)[candidates] > 0]
+        max_erasures = min(self.nsym - GMD_RESERVE, len(candidates))
+        for num_erasures in range(2, max_erasures + 1, 2):
+            try:
+                res = self.correct(block, synd, erase_pos=candidates[:num_erasures].tolist(), reserve=GMD_RESERVE)
+            except ReedSolomonError:
+                continue
+            if not self.syndromes(numpy.frombuffer(bytes(res), dtype=numpy.uint8)[None, :]).any():
+                return res
+        raise ReedSolomonError('could not correct errors')
+
+    def decode_blocks(self, blocks, distance=None):
+        '''
+        blocks is an (nblocks, n) uint8 array of codewords.
+        distance is optional, and the same shape: how unreliable each byte is. Used to guess erasures.
+        returns a list of decoded messages (bytes), with None for blocks that couldn't be corrected.
+        '''
+        blocks = numpy.asarray(blocks, dtype=numpy.uint8)
+        synd = self.syndromes(blocks)
+        dirty = synd.any(axis=1)
+
+        msg_len = blocks.shape[1] - self.nsym
+        res = []
+        for i, (block, s, d) in enumerate(zip(blocks, synd, dirty)):
+            if not d:
+                res.append(block[:msg_len].tobytes())
+                continue
+            try:
+                res.append(bytes(self.correct(block.tobytes(), s)[:msg_len]))
+                continue
+            except ReedSolomonError:
+                pass
+
+            try:
+                if distance is None:
+                    raise ReedSolomonError('no erasure info')
+                res.append(bytes(self._correct_with_erasures(block.tobytes(), s, distance[i])[:msg_len]))
+            except ReedSolomonError:
+                res.append(None)
+        return res
+
+    def decode(self, buffer, distance=None):
+        '''
+        split buffer into nsize codewords (the last may be shorter), and decode them all.
+        same result as a list of RSCodec.decode() calls, one per codeword -- unless `distance` is provided,
+        which gives blocks that would fail a second chance with erasures.
+        '''
+        full = len(buffer) // self.nsize * self.nsize
+        if distance is not None:
+            distance = numpy.asarray(distance)
+        res = []
+        if full:
+            blocks = numpy.frombuffer(buffer[:full], dtype=numpy.uint8).reshape(-1, self.nsize)
+            dist = distance[:full].reshape(-1, self.nsize) if distance is not None else None
+            res += self.decode_blocks(blocks, dist)
+        if full < len(buffer):
+            blocks = numpy.frombuffer(buffer[full:], dtype=numpy.uint8)[None, :]
+            dist = distance[None, full:] if distance is not None else None
+            res += self.decode_blocks(blocks, dist)
+        return res
@@ -1,4 +1,4 @@
-from reedsolo import RSCodec
+from .reed_solomon import ReedSolomonCodec
 
 
 class reed_solomon_stream:
@@ -6,7 +6,7 @@ class reed_solomon_stream:
         if mode not in ['read', 'write']:
             raise Exception('bad bit_file mode. Try "read" or "write"')
         self.mode = mode
-        self.rsc = RSCodec(ec, nsize=block_size, fcr=1, prim=0x187)
+        self.codec = ReedSolomonCodec(ec, nsize=block_size, fcr=1, prim=0x187)
         self.block_size = block_size
         self.empty_block = b'\0' * (block_size-ec) if on_failure is None else on_failure
 
@@ -28,18 +28,18 @@ class reed_solomon_stream:
             with self.f:  # close file
                 pass
 
-    def write(self, buffer):
-        i = 0
-        while i < len(buffer):
-            bu = buffer[i:i+self.block_size]
-            try:
-                decoded = bytes(self.rsc.decode(bu)[0])
-                self.f.write(decoded)
-            except:
-                print(f'failed decode at {i}')
-                self.f.write(self.empty_block)
-            i += self.block_size
+    def write(self, buffer, distance=None):
+        '''
+        syndromes for every block are checked at once. Only blocks with errors go through the full decode.
+        distance (optional) is a per-byte unreliability score. Blocks that can't be corrected as-is are retried
+        with their least reliable bytes treated as erasures.
+        '''
+        for i, decoded in enumerate(self.codec.decode(buffer, distance)):
+            if decoded is None:
+                print(f'failed decode at {i * self.block_size}')
+                decoded = self.empty_block
+            self.f.write(decoded)
 
     def read(self, max_bytes):
         raw = self.f.read(max_bytes)
-        return self.rsc.encode(raw)
+        return self.codec.encode(raw)
@@ -34,12 +34,13 @@ class fountain_decoder_stream:
             return True
 
         self.buffer += buffer
-        if len(self.buffer) < self.write_size:
-            return False
-
-        buffer = self.buffer[0:self.write_size]
-        self.buffer = self.buffer[self.write_size:]
+        while not self.done and len(self.buffer) >= self.write_size:
+            buffer = self.buffer[0:self.write_size]
+            self.buffer = self.buffer[self.write_size:]
+            self._write_chunk(buffer)
+        return self.done
 
+    def _write_chunk(self, buffer):
         # split buffer into header,chunk
         # get chunk_id and total_size from header
         hdr = fountain_header(buffer[0:fountain_header.length])
@@ -48,15 +49,14 @@ class fountain_decoder_stream:
         # sanity check/fail if hdr is bad? Will be all 0s if decode failed...
         if hdr.bad():
             print('failed fountain decode! ...move along')
-            return False
+            return
 
         if not self.fountain:
             self._reset(hdr.total_size)
 
         res = self.fountain.decode(hdr.chunk_id, buffer[fountain_header.length:])
         if not res:
-            return False
+            return
 
         self.f.write(res)
         self.done = True
-        return True
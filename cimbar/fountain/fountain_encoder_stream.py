@@ -33,6 +33,17 @@ class fountain_encoder_stream:
         self.chunk_id = 0
         self.len = len(contents)
 
+    def seek(self, index):
+        '''
+        jump to the `index`th chunk read() would return, without generating the ones before it.
+        chunk ids are sequential, except that read() skips the one short chunk: the tail end of the
+        systematic (original data) chunks.
+        '''
+        systematic = self.len // self.chunk_size
+        if self.len % self.chunk_size and index >= systematic:
+            index += 1
+        self.chunk_id = index
+
     def _header(self, chunk_id):
         return bytes(fountain_header(self.encode_id, self.len, chunk_id))
 
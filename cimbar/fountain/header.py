@@ -36,3 +36,41 @@ class fountain_header:
     def bad(self):
         return self.encode_id == 0 and self.total_size == 0 and self.chunk_id
 
+
+
+class segment_header:
+    '''
+    header for segmented fountain encodes, where each segment of the input has its own fountain encoder.
+    1 byte encode_id (the high bit flags the last segment), 2 bytes segment_id, 3 bytes segment_size, 2 bytes chunk_id
+    '''
+    length = 8
+    max_segment_size = 0xFFFFFF
+    max_segments = 0x10000
+
+    def __init__(self, encode_id, segment_id=None, segment_size=None, chunk_id=None, last=False):
+        if segment_id is None:
+            self.encode_id, self.segment_id, self.segment_size, self.chunk_id, self.last = self.from_encoded(encode_id)
+        else:
+            self.encode_id = encode_id
+            self.segment_id = segment_id
+            self.segment_size = segment_size
+            self.chunk_id = chunk_id
+            self.last = last
+
+    def __bytes__(self):
+        eid = self.encode_id + (0x80 if self.last else 0)
+        return (
+            int_to_bytes(eid, 1) + int_to_bytes(self.segment_id, 2) + int_to_bytes(self.segment_size, 3) +
+            int_to_bytes(self.chunk_id, 2)
+        )
+
+    @classmethod
+    def from_encoded(cls, encoded_bytes):
+        encode_id = int_from_bytes(encoded_bytes[0:1])
+        segment_id = int_from_bytes(encoded_bytes[1:3])
+        segment_size = int_from_bytes(encoded_bytes[3:6])
+        chunk_id = int_from_bytes(encoded_bytes[6:8])
+        return encode_id & 0x7F, segment_id, segment_size, chunk_id, bool(encode_id & 0x80)
+
+    def bad(self):
+        return self.segment_size == 0
@@ -0,0 +1,75 @@
+from .header import segment_header
+
+
+class segmented_decoder_stream:
+    '''
+    the other end of a segmented_encoder_stream. Segments are written out in order, as they complete.
+    only the segments that are still in progress (or done, but waiting on an earlier one) are held in memory.
+    '''
+    def __init__(self, f, chunk_size):
+        self.write_size = chunk_size
+        self.chunk_size = chunk_size - segment_header.length
+        if isinstance(f, str):
+            self.f = open(f, 'wb')
+        else:
+            self.f = f
+        self.buffer = b''
+        self.decoders = {}
+        self.finished = {}
+        self.next_segment = 0
+        self.last_segment = None
+        self.done = False
+        self.headers = []
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if not self.f.closed:
+            with self.f:
+                pass
+
+    def write(self, buffer):
+        if self.done:
+            return True
+
+        self.buffer += buffer
+        while not self.done and len(self.buffer) >= self.write_size:
+            buffer = self.buffer[0:self.write_size]
+            self.buffer = self.buffer[self.write_size:]
+            self._write_chunk(buffer)
+        return self.done
+
+    def _decoder(self, hdr):
+        from pywirehair import decoder
+        if hdr.segment_id not in self.decoders:
+            self.decoders[hdr.segment_id] = decoder(hdr.segment_size, self.chunk_size)
+        return self.decoders[hdr.segment_id]
+
+    def _write_chunk(self, buffer):
+        hdr = segment_header(buffer[0:segment_header.length])
+        self.headers.append(hdr)
+        if hdr.bad():
+            print('failed fountain decode! ...move along')
+            return
+
+        if hdr.last:
+            self.last_segment = hdr.segment_id
+        if hdr.segment_id < self.next_segment or hdr.segment_id in self.finished:
+            return  # already have this one
+
+        res = self._decoder(hdr).decode(hdr.chunk_id, buffer[segment_header.length:])
+        if not res:
+            return
+
+        del self.decoders[hdr.segment_id]
+        self.finished[hdr.segment_id] = res
+        while self.next_segment in self.finished:
+            self.f.write(self.finished.pop(self.next_segment))
+            self.next_segment += 1
+        if self.last_segment is not None and self.next_segment > self.last_segment:
+            self.done = True
@@ -0,0 +1,103 @@
+from .header import segment_header
+
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+MAX_BLOCKS = 64000  # wirehair's limit on blocks per encoder
+MIN_BLOCKS = 2  # ... and the fewest it will take
+
+
+class segmented_encoder_stream:
+    '''
+    like fountain_encoder_stream, but for inputs too big to hold in memory (or to describe in a fountain_header).
+    the input is read one segment at a time, and each segment gets its own fountain encoder.
+    segments go out in order, each as redundancy * (its number of chunks) chunks.
+    a tail too short to be a segment on its own is folded into the one before it.
+    segment_size is about how much of the input the encoder (and decoder) hold in memory. None is the default.
+    '''
+    def __init__(self, f, chunk_size, segment_size=None, redundancy=2, encode_id=108):
+        self.read_size = chunk_size
+        self.chunk_size = chunk_size - segment_header.length
+        segment_size = segment_size or DEFAULT_SEGMENT_SIZE
+        # leave room for a short tail
+        max_segment_size = min(segment_header.max_segment_size, MAX_BLOCKS * self.chunk_size) - self.chunk_size
+        if segment_size > max_segment_size:
+            raise Exception(f'segment_size {segment_size} is too large. Max is {max_segment_size}')
+        self.min_segment_size = (MIN_BLOCKS - 1) * self.chunk_size + 1
+        if segment_size < self.min_segment_size:
+            raise Exception(f'segment_size {segment_size} is too small. Min is {self.min_segment_size}')
+        self.segment_size = segment_size
+        self.redundancy = redundancy
+        self.encode_id = encode_id
+
+        if isinstance(f, str):
+            self.f = open(f, 'rb')
+        else:
+            self.f = f
+
+        self.segment_id = -1
+        self.remaining = 0
+        self.lookahead = self._read_fully(1)
+        self._next_segment()
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if not self.f.closed:
+            with self.f:  # close file
+                pass
+
+    def _read_fully(self, size):
+        # stream readers (like zstd's) may return less than we asked for before they're done
+        res = b''
+        while len(res) < size:
+            bites = self.f.read(size - len(res))
+            if not bites:
+                break
+            res += bites
+        return res
+
+    def _next_segment(self):
+        from pywirehair import encoder
+        contents = self.lookahead + self._read_fully(self.segment_size - len(self.lookahead))
+        self.lookahead = self._read_fully(self.min_segment_size)
+        if len(self.lookahead) < self.min_segment_size:
+            # that's the end, and it's too short for wirehair. It goes with this segment
+            contents += self.lookahead
+            self.lookahead = b''
+
+        self.segment_id += 1
+        if self.segment_id >= segment_header.max_segments:
+            raise Exception(f'too many segments. Try a larger segment_size than {self.segment_size}')
+        self.fountain = encoder(contents, self.chunk_size)
+        self.len = len(contents)
+        self.last = not self.lookahead
+        self.chunk_id = 0
+        self.remaining = -(-self.len // self.chunk_size) * self.redundancy
+
+    @property
+    def exhausted(self):
+        return self.last and not self.remaining
+
+    def _header(self, chunk_id):
+        return bytes(segment_header(self.encode_id, self.segment_id, self.len, chunk_id, self.last))
+
+    def read(self, max_bytes):
+        if max_bytes % self.read_size != 0:
+            raise Exception(f'{max_bytes} must be a multiple of {self.read_size}')
+
+        if not self.remaining:
+            if self.last:
+                return b''
+            self._next_segment()
+
+        bites = b''
+        while len(bites) < self.chunk_size:
+            bites = self.fountain.encode(self.chunk_id)
+            self.chunk_id += 1
+        self.remaining -= 1
+        return self._header(self.chunk_id - 1) + bites
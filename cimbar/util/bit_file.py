@@ -1,10 +1,41 @@
-import bitstring
-from bitstring import Bits, BitStream
+import numpy
 
 
 MAX_ENCODING = 16384
 
 
+def _bit_weights(bits_per_op):
+    return numpy.left_shift(1, numpy.arange(bits_per_op-1, -1, -1, dtype=numpy.uint32), dtype=numpy.uint32)
+
+
+def bits_to_uints(bits, bits_per_op):
+    '''
+    bits is a flat array of 0s and 1s, msb first. len(bits) must be a multiple of bits_per_op.
+    '''
+    return bits.reshape(-1, bits_per_op).astype(numpy.uint32) @ _bit_weights(bits_per_op)
+
+
+def uints_to_bits(values, bits_per_op):
+    ''' the inverse of bits_to_uints '''
+    shifts = numpy.arange(bits_per_op-1, -1, -1, dtype=numpy.uint32)
+    values = numpy.asarray(values, dtype=numpy.uint32)
+    return ((values[..., None] >> shifts) & 1).astype(numpy.uint8).reshape(-1)
+
+
+def unpack_uints(buffer, bits_per_op):
+    '''
+    split a bytes-like buffer into an array of bits_per_op-sized uints.
+    trailing bits that don't make a full value are dropped.
+    '''
+    bits = numpy.unpackbits(numpy.frombuffer(buffer, dtype=numpy.uint8))
+    return bits_to_uints(bits[:len(bits) - len(bits) % bits_per_op], bits_per_op)
+
+
+def pack_uints(values, bits_per_op):
+    ''' pack an array of bits_per_op-sized uints into bytes. The last byte is zero-padded. '''
+    return numpy.packbits(uints_to_bits(values, bits_per_op)).tobytes()
+
+
 class bit_file:
     def __init__(self, f, bits_per_op, mode='read', keep_open=False, read_size=MAX_ENCODING, read_count=1):
         if mode not in ['read', 'write']:
@@ -19,7 +50,11 @@ class bit_file:
             self.f = f
             self.keep_open = keep_open  # determines whether __exit__ is a flush()+close(), or just a flush()
         self.bits_per_op = bits_per_op
-        self.stream = BitStream()
+
+        # read: a flat array of unread bits. write: a list of bit arrays, concatenated on save()
+        self.stream = numpy.zeros(0, dtype=numpy.uint8)
+        self.pos = 0
+        self.pending = []
 
         self.read_size = read_size
         self.read_count = read_count
@@ -36,39 +71,77 @@ class bit_file:
 
     def write(self, bits):
         if isinstance(bits, bit_write_buffer):
-            bits = bits.stream
-        if not isinstance(bits, Bits):
-            bits = Bits(uint=bits, length=self.bits_per_op)
-        self.stream.append(bits)
+            self.pending.append(bits.bits())
+        else:
+            self.write_array([bits])
 
-    def read(self, bits_per_op=None):
+    def write_array(self, values, bits_per_op=None):
+        bits_per_op = bits_per_op or self.bits_per_op
+        self.pending.append(uints_to_bits(values, bits_per_op))
+
+    def _refill(self):
+        self.stream = numpy.unpackbits(numpy.frombuffer(self.f.read(self.read_size), dtype=numpy.uint8))
+        self.pos = 0
+        self.read_count -= 1
+        if not len(self.stream):  # the file ran out before read_count did
+            self.read_count = 0
+
+    def eof(self):
+        ''' True if there's nothing left to read. May refill '''
+        if self.read_count and self.pos == len(self.stream):
+            self._refill()
+        return self.pos == len(self.stream)
+
+    def read_array(self, count, bits_per_op=None):
+        '''
+        read `count` values of bits_per_op bits each, refilling from the file as needed.
+        Same semantics as `count` calls to read(): a value straddling the end of a read_size chunk is
+        truncated to the bits that remain, and reads past the end of the file are 0.
+        '''
         bits_per_op = bits_per_op or self.bits_per_op
-        if self.read_count and self.stream.bitpos == self.stream.length:
-            self.stream.clear()
-            self.stream.append(Bits(bytes=self.f.read(self.read_size)))
-            self.read_count -= 1
-
-        try:
-            bits = self.stream.read(f'uint:{bits_per_op}')
-        except bitstring.ReadError:
-            try:
-                bits = self.stream.read('uint')
-            except bitstring.InterpretError:
-                bits = 0
-        return bits
+        res = numpy.zeros(count, dtype=numpy.uint32)
+        i = 0
+        while i < count:
+            if self.read_count and self.pos == len(self.stream):
+                self._refill()
+
+            avail = len(self.stream) - self.pos
+            full = min(count - i, avail // bits_per_op)
+            end = self.pos + full * bits_per_op
+            res[i:i+full] = bits_to_uints(self.stream[self.pos:end], bits_per_op)
+            self.pos = end
+            i += full
+            if i == count:
+                break
+
+            if self.pos < len(self.stream):  # partial value
+                res[i] = bits_to_uints(self.stream[self.pos:], len(self.stream) - self.pos)[0]
+                self.pos = len(self.stream)
+            elif not self.read_count:  # nothing left, the rest are zeroes
+                break
+            elif avail:  # exactly exhausted. Refill and keep going
+                continue
+            i += 1
+        return res
+
+    def read(self, bits_per_op=None):
+        return int(self.read_array(1, bits_per_op)[0])
 
     def save(self):
-        self.f.write(self.stream.tobytes())
+        if self.pending:
+            self.f.write(numpy.packbits(numpy.concatenate(self.pending)).tobytes())
+        self.pending = []
 
 
 class bit_write_buffer():
     def __init__(self, bits_per_op, **kwargs):
         super().__init__()
-        self.stream = BitStream()
+        self.values = []
         self.bits_per_op = bits_per_op
 
     def write(self, bits):
-        b1 = Bits(uint=bits, length=self.bits_per_op)
-        prev = len(self.stream)
-        self.stream.append(b1)
-        return len(self.stream) - prev
+        self.values.append(bits)
+        return self.bits_per_op
+
+    def bits(self):
+        return uints_to_bits(self.values, self.bits_per_op)
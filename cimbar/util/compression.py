@@ -0,0 +1,169 @@
+import os
+from time import perf_counter
+
+import zstandard as zstd
+
+
+DEFAULT_LEVEL = 16
+SAMPLE_SIZE = 64 * 1024
+NUM_SAMPLES = 4
+# (sampled compression ratio, most effort worth spending on it). Already-compressed media tops out at ~1.0
+ADAPTIVE_LEVELS = [(0.98, 1), (0.9, 3)]
+# below this, zstd won't split the work into enough jobs for extra threads to help
+THREADED_MIN_SIZE = 16 * 1024 * 1024
+DEFAULT_DICT_SIZE = 16 * 1024
+FRAME_HEADER_MAX = 18  # ZSTD_FRAMEHEADERSIZE_MAX
+
+
+def _input_size(f):
+    try:
+        return os.fstat(f.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def load_dictionary(filename):
+    ''' a trained zstd dictionary, e.g. from train_dictionary() or `zstd --train` '''
+    with open(filename, 'rb') as f:
+        return zstd.ZstdCompressionDict(f.read())
+
+
+def train_dictionary(samples, dict_size=DEFAULT_DICT_SIZE, dict_id=0):
+    '''
+    samples is a list of bytes, each one a typical payload. dict_id=0 picks a random one.
+    the dictionary id is written into every zstd frame compressed with it, so a decoder can tell which one it needs.
+    '''
+    return zstd.train_dictionary(dict_size, samples, dict_id=dict_id)
+
+
+def sample_ratio(f, sample_size=SAMPLE_SIZE, num_samples=NUM_SAMPLES, dict_data=None):
+    '''
+    estimate how well f will compress, by compressing a few samples spread through it with zstd's fastest settings.
+    f must be seekable, and is rewound afterwards. returns None if we can't tell.
+    '''
+    size = _input_size(f)
+    if not size or not f.seekable():
+        return None
+
+    cctx = zstd.ZstdCompressor(level=1, dict_data=dict_data)
+    step = max(size // num_samples, sample_size)
+    total_in = total_out = 0
+    for offset in range(0, size, step):
+        f.seek(offset)
+        sample = f.read(sample_size)
+        total_in += len(sample)
+        total_out += len(cctx.compress(sample))
+    f.seek(0)
+    return total_out / total_in
+
+
+def choose_params(f, level=DEFAULT_LEVEL, threads=None, dict_data=None):
+    '''
+    the zstd level and thread count for f.
+    incompressible inputs get a lower level: spending level 16's effort on them gains nothing.
+    threads=None is automatic: one per cpu, for inputs big enough to split up (or of unknown size).
+    zstd's output depends on whether it's threaded, but not on how many threads. So that's decided by the input
+    alone -- the same input makes the same fountain stream on any machine.
+    '''
+    ratio = sample_ratio(f, dict_data=dict_data)
+    if ratio is not None:
+        for min_ratio, max_level in ADAPTIVE_LEVELS:
+            if ratio >= min_ratio:
+                level = min(level, max_level)
+                break
+
+    if threads is None:
+        size = _input_size(f)
+        threaded = size is None or size >= THREADED_MIN_SIZE
+        threads = max(os.cpu_count() or 1, 1) if threaded else 0
+    return level, threads
+
+
+class compressing_reader:
+    '''
+    zstd compresses f as it's read. Keeps track of how much went in and came out, and how long it took.
+    '''
+    def __init__(self, f, level=DEFAULT_LEVEL, threads=0, dict_data=None):
+        self.level = level
+        self.threads = threads
+        self.cctx = zstd.ZstdCompressor(level=level, threads=threads, dict_data=dict_data)
+        self.reader = self.cctx.stream_reader(f)
+        self.elapsed = 0
+
+    @property
+    def closed(self):
+        return self.reader.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.reader.close()
+
+    def read(self, size=-1):
+        start = perf_counter()
+        bites = self.reader.read(size)
+        self.elapsed += perf_counter() - start
+        return bites
+
+    def stats(self):
+        ''' (bytes in, bytes out) '''
+        ingested, _, produced = self.cctx.frame_progression()
+        return ingested, produced
+
+    def report(self):
+        bytes_in, bytes_out = self.stats()
+        ratio = bytes_out / bytes_in if bytes_in else 1
+        return (
+            f'compressed {bytes_in} -> {bytes_out} bytes (ratio {ratio:.3f}, level {self.level}, '
+            f'{self.threads} threads) in {self.elapsed:.2f}s'
+        )
+
+
+class dictionary_decompressor:
+    '''
+    a zstd stream_writer that waits for the zstd frame header to pick its dictionary, by the id the encoder wrote there.
+    dictionaries is a list of ZstdCompressionDicts. Frames compressed without one decompress as usual.
+    '''
+    def __init__(self, f, dictionaries=()):
+        self.f = f
+        self.dictionaries = {d.dict_id(): d for d in dictionaries}
+        self.writer = None
+        self.buffer = b''
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if self.writer is None and self.buffer:
+            self._start(zstd.get_frame_parameters(self.buffer).dict_id)
+            self.writer.write(self.buffer)
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.f.close()
+
+    def _start(self, dict_id):
+        if dict_id and dict_id not in self.dictionaries:
+            raise Exception(f'this needs zstd dictionary {dict_id} to decompress. Have: {list(self.dictionaries)}')
+        dctx = zstd.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        self.writer = dctx.stream_writer(self.f)
+
+    def write(self, data):
+        if self.writer is None:
+            self.buffer += data
+            if len(self.buffer) < FRAME_HEADER_MAX:
+                return len(data)  # wait for the whole frame header
+            self._start(zstd.get_frame_parameters(self.buffer).dict_id)
+            data, self.buffer = self.buffer, b''
+        return self.writer.write(data)
@@ -1,6 +1,8 @@
 from collections import defaultdict
 
-from .bit_file import bit_file, bit_write_buffer
+import numpy
+
+from .bit_file import bit_file, bit_write_buffer, pack_uints
 
 
 def interleave(l, num_chunks, partitions=1, index=False):
@@ -23,6 +25,40 @@ def interleave_reverse(l, num_chunks, partitions=1):
     return {lin: ilv for ilv, (_, lin) in encoded}, block_size
 
 
+def interleave_permutation(l, num_chunks, partitions=1):
+    '''
+    the decoder's version of interleave_reverse(): an index array that gathers a frame's per-cell values
+    (indexed like `l`) into stream order -- grouped by interleave block, in the same order interleaved_writer would.
+    '''
+    lookup, block_size = interleave_reverse(l, num_chunks, partitions)
+    blocks = numpy.array([lookup[i] // block_size for i in range(len(l))])
+    return numpy.argsort(blocks, kind='stable')
+
+
+def deinterleave_bytes(values, permutation, bits_per_op):
+    ''' one gather, one pack. Equivalent to writing every value through an interleaved_writer. '''
+    return pack_uints(numpy.asarray(values)[permutation], bits_per_op)
+
+
+def deinterleave_distance(values, permutation, bits_per_op):
+    '''
+    like deinterleave_bytes(), but for a per-cell score. Each output byte gets the max score of the cells
+    that contributed bits to it.
+    '''
+    bits = numpy.repeat(numpy.asarray(values)[permutation], bits_per_op)
+    bits = numpy.pad(bits, (0, -len(bits) % 8))
+    return bits.reshape(-1, 8).max(axis=1)
+
+
+def deinterleave_bit_scores(values, permutation, bits_per_op):
+    '''
+    like deinterleave_distance(), but one score per bit instead of per byte.
+    the padding bits at the end of the last byte copy the last score.
+    '''
+    bits = numpy.repeat(numpy.asarray(values)[permutation], bits_per_op)
+    return numpy.pad(bits, (0, -len(bits) % 8), mode='edge')
+
+
 class interleaved_writer:
     def __init__(self, **kwargs):
         self.writer = bit_file(**kwargs)
@@ -0,0 +1,164 @@
+import os
+import struct
+from os import path
+
+
+MAGIC = b'CMBP'
+_HEADER = struct.Struct('>4sI')  # magic, number of files
+_ENTRY = struct.Struct('>HQQ')  # name length, size, offset. The name follows
+
+
+def _walk(filenames):
+    ''' (archive name, filename) for every file. Directories contribute everything under them, by relative path '''
+    for filename in filenames:
+        if not path.isdir(filename):
+            yield path.basename(filename), filename
+            continue
+        root = path.dirname(path.normpath(filename))
+        for dirpath, dirnames, files in os.walk(filename):
+            dirnames.sort()
+            for name in sorted(files):
+                full = path.join(dirpath, name)
+                yield path.relpath(full, root).replace(os.sep, '/'), full
+
+
+def pack_index(entries):
+    ''' entries is a list of (name, size). Offsets count from the end of the index. '''
+    index = _HEADER.pack(MAGIC, len(entries))
+    offset = 0
+    for name, size in entries:
+        encoded = name.encode('utf-8')
+        index += _ENTRY.pack(len(encoded), size, offset) + encoded
+        offset += size
+    return index
+
+
+class pack_reader:
+    '''
+    many files, read as one stream: an index of (name, size, offset) entries, then the contents back to back.
+    files are opened one at a time, when the read gets to them.
+    '''
+    def __init__(self, filenames):
+        files = list(_walk(filenames))
+        names = {}
+        for name, filename in files:
+            if name in names:
+                raise Exception(f'{filename} and {names[name]} would both unpack to {name}')
+            names[name] = filename
+        self.sizes = [path.getsize(filename) for _, filename in files]
+        self.buffer = pack_index([(name, size) for (name, _), size in zip(files, self.sizes)])
+        self.len = len(self.buffer) + sum(self.sizes)
+        self.pending = [filename for _, filename in files]
+        self.f = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+        self.closed = True
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.len
+        res = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        while len(res) < size:
+            if self.f is None:
+                if not self.pending:
+                    break
+                self.f = open(self.pending.pop(0), 'rb')
+            bites = self.f.read(size - len(res))
+            if not bites:
+                self.f.close()
+                self.f = None
+            res += bites
+        return res
+
+
+def _safe_path(dirname, name):
+    parts = name.split('/')
+    if not name or path.isabs(name) or any(p in ('', '.', '..') for p in parts):
+        raise Exception(f'bad file name in archive: {name!r}')
+    return path.join(dirname, *parts)
+
+
+class pack_writer:
+    '''
+    the other side of pack_reader: takes the stream in whatever size pieces it comes,
+    and writes the files out under dirname. Anything after the last file (e.g. frame padding) is ignored.
+    '''
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.buffer = b''
+        self.entries = None
+        self.f = None
+        self.remaining = 0
+        self.closed = False
+        os.makedirs(dirname, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+        self.closed = True
+
+    def _read_index(self):
+        if len(self.buffer) < _HEADER.size:
+            return False
+        magic, count = _HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise Exception('not a cimbar pack archive')
+
+        entries = []
+        pos = _HEADER.size
+        for _ in range(count):
+            if len(self.buffer) < pos + _ENTRY.size:
+                return False
+            name_len, size, _ = _ENTRY.unpack_from(self.buffer, pos)
+            pos += _ENTRY.size
+            if len(self.buffer) < pos + name_len:
+                return False
+            entries.append((self.buffer[pos:pos+name_len].decode('utf-8'), size))
+            pos += name_len
+
+        self.entries = entries
+        self.buffer = self.buffer[pos:]
+        return True
+
+    def _next_file(self):
+        name, self.remaining = self.entries.pop(0)
+        filename = _safe_path(self.dirname, name)
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        self.f = open(filename, 'wb')
+
+    def write(self, data):
+        self.buffer += data
+        if self.entries is None and not self._read_index():
+            return len(data)
+
+        while self.entries or self.f:
+            if self.f is None:
+                self._next_file()
+            bites = self.buffer[:self.remaining]
+            self.buffer = self.buffer[len(bites):]
+            self.f.write(bites)
+            self.remaining -= len(bites)
+            if self.remaining:
+                break
+            self.f.close()
+            self.f = None
+        if not self.entries and self.f is None:
+            self.buffer = b''
+        return len(data)
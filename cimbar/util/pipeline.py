@@ -0,0 +1,134 @@
+from collections import namedtuple
+from queue import Queue, Empty, Full
+from threading import Event, Lock, Semaphore, Thread
+
+
+# fn: one item in, one item out. workers: how many threads run fn
+stage = namedtuple('stage', 'fn workers')
+
+
+_DONE = object()
+_POLL = 0.1
+
+
+class _failed:
+    def __init__(self, e):
+        self.e = e
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL)
+            return
+        except Full:
+            pass
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL)
+        except Empty:
+            pass
+    return _DONE
+
+
+def _acquire(sem, stop):
+    while not stop.is_set():
+        if sem.acquire(timeout=_POLL):
+            return True
+    return False
+
+
+def _feed(items, q_out, stop, window):
+    try:
+        for seq, item in enumerate(items):
+            if window is not None and not _acquire(window, stop):
+                return
+            if stop.is_set():
+                return
+            _put(q_out, (seq, item), stop)
+    except Exception as e:
+        _put(q_out, (-1, _failed(e)), stop)
+    _put(q_out, _DONE, stop)
+
+
+class _stage_runner:
+    def __init__(self, st, q_in, q_out, stop):
+        self.fn = st.fn
+        self.q_in = q_in
+        self.q_out = q_out
+        self.stop = stop
+        self.remaining = st.workers
+        self.lock = Lock()
+        self.threads = [Thread(target=self.run, daemon=True) for _ in range(st.workers)]
+
+    def run(self):
+        while True:
+            item = _get(self.q_in, self.stop)
+            if item is _DONE:
+                break
+            seq, val = item
+            if not isinstance(val, _failed):
+                try:
+                    val = self.fn(val)
+                except Exception as e:
+                    val = _failed(e)
+            _put(self.q_out, (seq, val), self.stop)
+
+        # pass the end marker along to our siblings. The last one out tells the next stage
+        _put(self.q_in, _DONE, self.stop)
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining == 0:
+                _put(self.q_out, _DONE, self.stop)
+
+
+def pipeline(items, stages, queue_size=2, ordered=True):
+    '''
+    run items through a chain of stages, each in its own thread(s), connected by bounded queues.
+    a full queue blocks the stage that feeds it, so a slow stage holds back everything upstream of it
+    instead of letting work pile up in memory.
+
+    yields the output of the last stage, in input order if `ordered` -- otherwise as soon as it's ready.
+    an exception in any stage is raised here. Stopping early (close() or break) shuts the threads down.
+
+    in order, one slow item holds up everything after it. Those results wait here, so the feeder is only allowed
+    so far ahead of the last yield: what the stages and queues can hold, plus queue_size finished items.
+    '''
+    stop = Event()
+    queues = [Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    # a slot per item between the feeder and the yield. Released as each one goes out
+    window = None
+    if ordered:
+        window = Semaphore(queue_size * (len(queues) + 1) + sum(st.workers for st in stages))
+    threads = [Thread(target=_feed, args=(items, queues[0], stop, window), daemon=True)]
+    for st, q_in, q_out in zip(stages, queues, queues[1:]):
+        threads += _stage_runner(st, q_in, q_out, stop).threads
+    for t in threads:
+        t.start()
+
+    done = {}
+    next_seq = 0
+    try:
+        while True:
+            item = _get(queues[-1], stop)
+            if item is _DONE:
+                break
+            seq, val = item
+            if isinstance(val, _failed):
+                raise val.e
+            if not ordered:
+                yield val
+                continue
+
+            done[seq] = val
+            while next_seq in done:
+                window.release()
+                yield done.pop(next_seq)
+                next_seq += 1
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -0,0 +1,67 @@
+from collections import namedtuple
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy
+
+
+# worker side: shared memory blocks we've already attached to, by name
+_attached = {}
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        # this registers the block with the resource tracker again. That's fine as long as the workers share the
+        # parent's tracker -- spawned ones always do, forked ones if it was running before the fork. Then the pool
+        # that created the block unlinks it, which unregisters it too.
+        # Unregistering here would pull the parent's registration out from under it.
+        shm = _attached[name] = SharedMemory(name=name)
+    return shm
+
+
+class shared_frame(namedtuple('shared_frame', 'name slot offset shape dtype')):
+    '''
+    a picklable handle to one image in a shared_frame_pool. Cheap to send to another process.
+    '''
+    def array(self):
+        ''' a zero-copy view of the image. Only valid until the slot is released. '''
+        shm = _attach(self.name)
+        return numpy.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf, offset=self.offset)
+
+
+class shared_frame_pool:
+    '''
+    a fixed number of image-sized slots in one block of shared memory, so we can hand frames
+    to worker processes without pickling them.
+    put() copies an image into a free slot. Release the slot when the worker is done with it.
+    forked workers should be started after resource_tracker.ensure_running(). See _attach()
+    '''
+    def __init__(self, num_slots, slot_bytes):
+        self.slot_bytes = slot_bytes
+        self.shm = SharedMemory(create=True, size=num_slots * slot_bytes)
+        self.free = list(range(num_slots))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.shm.close()
+        self.shm.unlink()
+
+    def fits(self, img):
+        return img.nbytes <= self.slot_bytes
+
+    def put(self, img):
+        if not self.free:
+            raise Exception('no free slots in shared_frame_pool')
+        if not self.fits(img):
+            raise Exception(f'image too large for shared_frame_pool: {img.nbytes} > {self.slot_bytes}')
+
+        slot = self.free.pop()
+        offset = slot * self.slot_bytes
+        view = numpy.ndarray(img.shape, dtype=img.dtype, buffer=self.shm.buf, offset=offset)
+        view[:] = img
+        return shared_frame(self.shm.name, slot, offset, img.shape, img.dtype.str)
+
+    def release(self, frame):
+        self.free.append(frame.slot)
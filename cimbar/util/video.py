@@ -0,0 +1,187 @@
+import struct
+import sys
+import zlib
+from fractions import Fraction
+from os import path
+
+import cv2
+import numpy
+
+
+VIDEO_EXTENSIONS = ('.avi', '.mkv', '.mov', '.mp4', '.webm')
+# containers we can write losslessly (ffv1). Lossy codecs smear the cells too much to decode reliably
+LOSSLESS_VIDEO_EXTENSIONS = ('.avi', '.mkv')
+APNG_EXTENSIONS = ('.apng',)
+
+
+def is_video(filename):
+    return isinstance(filename, str) and path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS
+
+
+def parse_frame_size(size):
+    ''' "1024x1024" -> (1024, 1024) '''
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def video_frames(filename, stride=1):
+    ''' yields every `stride`th frame of a video file, as (BGR) numpy arrays '''
+    cap = cv2.VideoCapture(filename)
+    if not cap.isOpened():
+        raise Exception(f'could not open video {filename}')
+    try:
+        i = 0
+        while True:
+            if i % stride:
+                # grab() skips the frame without paying to decode it
+                if not cap.grab():
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield frame
+            i += 1
+    finally:
+        cap.release()
+
+
+def raw_frames(f, width, height, stride=1):
+    '''
+    yields every `stride`th frame of a raw rgb24 stream (e.g. ffmpeg -f rawvideo -pix_fmt rgb24), as (BGR) numpy arrays.
+    f is a file object or path. "-" is stdin.
+    '''
+    if f == '-':
+        f = sys.stdin.buffer
+    elif isinstance(f, str):
+        with open(f, 'rb') as fh:
+            yield from raw_frames(fh, width, height, stride)
+        return
+
+    frame_size = width * height * 3
+    i = 0
+    while True:
+        buff = f.read(frame_size)
+        if len(buff) < frame_size:
+            break
+        if i % stride == 0:
+            frame = numpy.frombuffer(buff, dtype=numpy.uint8).reshape(height, width, 3)
+            yield cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        i += 1
+
+
+class raw_writer:
+    ''' writes frames as a raw rgb24 stream -- the format raw_frames() reads. "-" is stdout. '''
+    takes_png = False
+
+    def __init__(self, f):
+        self.f = sys.stdout.buffer if f == '-' else open(f, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.f is sys.stdout.buffer:
+            self.f.flush()
+        else:
+            self.f.close()
+
+    def write(self, frame_num, img):
+        self.f.write(numpy.ascontiguousarray(img).data)
+
+
+class video_writer:
+    ''' writes (RGB) frames into a lossless (ffv1) video '''
+    takes_png = False
+
+    def __init__(self, filename, fps):
+        if path.splitext(filename)[1].lower() not in LOSSLESS_VIDEO_EXTENSIONS:
+            raise Exception(f'no lossless video codec for {filename}. Try one of {LOSSLESS_VIDEO_EXTENSIONS}')
+        self.filename = filename
+        self.fps = fps
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.writer is not None:
+            self.writer.release()
+
+    def write(self, frame_num, img):
+        if self.writer is None:
+            height, width = img.shape[:2]
+            self.writer = cv2.VideoWriter(self.filename, cv2.VideoWriter_fourcc(*'FFV1'), self.fps, (width, height))
+            if not self.writer.isOpened():
+                raise Exception(f'could not open video {self.filename} for writing')
+        self.writer.write(cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
+
+
+def _png_chunks(png):
+    pos = 8  # skip the signature
+    while pos < len(png):
+        length, kind = struct.unpack('>I4s', png[pos:pos+8])
+        yield kind, png[pos+8:pos+8+length]
+        pos += length + 12
+
+
+def _write_chunk(f, kind, data):
+    f.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+class apng_writer:
+    '''
+    stitches png-compressed frames into one animated png, without decompressing them again.
+    The frames must all be the same size and color type, with the same palette.
+    The first frame is the default image, so non-animated viewers still show something decodable.
+    The frame count goes in the acTL chunk up front, so we patch it in at the end -- the file must be seekable.
+    '''
+    takes_png = True
+
+    def __init__(self, filename, fps):
+        self.f = open(filename, 'wb')
+        delay = Fraction(1 / fps).limit_denominator(0xFFFF)
+        self.delay = (delay.numerator, delay.denominator)
+        self.num_frames = 0
+        self.seq = 0
+        self.actl_pos = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        with self.f:
+            if self.actl_pos is None:
+                return
+            _write_chunk(self.f, b'IEND', b'')
+            self.f.seek(self.actl_pos)
+            _write_chunk(self.f, b'acTL', struct.pack('>II', self.num_frames, 0))
+
+    def _next_seq(self):
+        self.seq += 1
+        return self.seq - 1
+
+    def write(self, frame_num, png):
+        chunks = list(_png_chunks(png))
+        if self.actl_pos is None:
+            self.f.write(png[:8])
+            _write_chunk(self.f, b'IHDR', chunks[0][1])
+            self.actl_pos = self.f.tell()
+            _write_chunk(self.f, b'acTL', struct.pack('>II', 0, 0))
+            # the palette (PLTE) and friends. Every frame must share them
+            for kind, data in chunks[1:]:
+                if kind in (b'IDAT', b'IEND'):
+                    break
+                _write_chunk(self.f, kind, data)
+        width, height = struct.unpack('>II', chunks[0][1][:8])
+
+        fctl = struct.pack('>IIIIIHHBB', self._next_seq(), width, height, 0, 0, *self.delay, 0, 0)
+        _write_chunk(self.f, b'fcTL', fctl)
+        for kind, data in chunks:
+            if kind != b'IDAT':
+                continue
+            if self.num_frames == 0:
+                _write_chunk(self.f, b'IDAT', data)
+            else:
+                _write_chunk(self.f, b'fdAT', struct.pack('>I', self._next_seq()) + data)
+        self.num_frames += 1
@@ -0,0 +1,54 @@
+from io import BytesIO
+from unittest import TestCase
+
+import numpy
+
+from cimbar.util.bit_file import bit_file, pack_uints, unpack_uints
+
+
+class BitFileTest(TestCase):
+    def test_read(self):
+        f = bit_file(BytesIO(b'\xab\xcd\xef'), bits_per_op=4)
+        self.assertEqual(0xa, f.read())
+        self.assertEqual(0x2, f.read(2))
+        self.assertEqual(0x3, f.read(2))
+        self.assertEqual([0xc, 0xd, 0xe, 0xf], list(f.read_array(4)))
+        # past the end
+        self.assertEqual([0, 0], list(f.read_array(2)))
+
+    def test_read_array_across_chunks(self):
+        data = bytes(range(32))
+        f = bit_file(BytesIO(data), bits_per_op=6, read_size=3, read_count=100)
+        res = f.read_array(8)
+        # each 3 byte chunk is exactly 4 6-bit values
+        self.assertEqual(list(unpack_uints(data[:6], 6)), list(res))
+
+    def test_read_array_partial(self):
+        f = bit_file(BytesIO(b'\xff\xff'), bits_per_op=6)
+        # 16 bits -> 2 full values, then the leftover 4 bits
+        self.assertEqual([63, 63, 15, 0], list(f.read_array(4)))
+
+    def test_eof(self):
+        f = bit_file(BytesIO(bytes(4)), bits_per_op=8, read_size=2, read_count=float('inf'))
+        self.assertFalse(f.eof())
+        f.read_array(3)
+        self.assertFalse(f.eof())
+        f.read_array(1)
+        # the file ran dry before read_count did
+        self.assertTrue(f.eof())
+        self.assertEqual(0, f.read_count)
+
+    def test_write(self):
+        outbuff = BytesIO()
+        with bit_file(outbuff, bits_per_op=4, mode='write', keep_open=True) as f:
+            f.write(0xa)
+            f.write_array([0xb, 0xc])
+            f.write_array([0x3], bits_per_op=2)
+
+        self.assertEqual(b'\xab\xcc', outbuff.getvalue())
+
+    def test_pack_round_trip(self):
+        values = numpy.random.randint(0, 64, 200)
+        packed = pack_uints(values, 6)
+        self.assertEqual(150, len(packed))
+        self.assertEqual(list(values), list(unpack_uints(packed, 6)))
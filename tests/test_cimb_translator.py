@@ -1,9 +1,13 @@
-from os import path
+from os import listdir, path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
+import numpy
 from PIL import Image
 
-from cimbar.encode.cimb_translator import CimbDecoder
+from cimbar.encode.cimb_translator import (
+    CimbDecoder, CimbEncoder, load_tile, palettize, possible_colors, tile_atlas
+)
 
 
 CIMBAR_ROOT = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..'))
@@ -40,3 +44,71 @@ class CimbDecoderTest(TestCase):
 
         color = cimb.decode_color(img2, 0)
         self.assertEqual(color, 2)
+
+
+class CimbEncoderTest(TestCase):
+    def test_atlas_matches_tiles(self):
+        with TemporaryDirectory() as cache_dir:
+            atlas = tile_atlas(True, 4, 2, cache_dir=cache_dir)
+            self.assertEqual((64, 8, 8, 3), atlas.shape)
+            self.assertEqual(1, len(listdir(cache_dir)))
+
+            colors = possible_colors(True, 2)
+            for bits in (0, 5, 21, 63):
+                name = path.join(CIMBAR_ROOT, 'bitmap', '4', f'{bits % 16:02x}.png')
+                expected = load_tile(name, True, {(0, 255, 255, 255): colors[bits // 16]}).convert('RGB')
+                self.assertTrue(numpy.array_equal(numpy.array(expected), atlas[bits]))
+
+            # second load comes from disk
+            tile_atlas.cache_clear()
+            self.assertTrue(numpy.array_equal(atlas, tile_atlas(True, 4, 2, cache_dir=cache_dir)))
+
+    def test_encode(self):
+        cimb = CimbEncoder(False, 4, 2)
+        img = cimb.encode(17)
+        self.assertEqual((8, 8), img.size)
+        self.assertTrue(numpy.array_equal(numpy.array(img), cimb.atlas[17]))
+
+    def test_render(self):
+        cimb = CimbEncoder(True, 4, 2)
+        positions = numpy.array([(0, 0), (9, 0), (3, 12)])
+        values = numpy.array([1, 40, 63])
+
+        frame = cimb.render(numpy.zeros((24, 24, 3), dtype=numpy.uint8), positions, values)
+
+        expected = Image.new('RGB', (24, 24))
+        for (x, y), bits in zip(positions, values):
+            expected.paste(cimb.encode(bits), (int(x), int(y)))
+        self.assertTrue(numpy.array_equal(numpy.array(expected), frame))
+
+    def test_render_indexed(self):
+        cimb = CimbEncoder(True, 4, 2)
+        positions = numpy.array([(0, 0), (9, 0), (3, 12)])
+        values = numpy.array([1, 40, 63])
+        frame = cimb.render(numpy.zeros((24, 24, 3), dtype=numpy.uint8), positions, values)
+
+        palette, (atlas, template) = palettize(cimb.atlas, numpy.zeros((24, 24, 3), dtype=numpy.uint8))
+        self.assertEqual((64, 8, 8), atlas.shape)
+        self.assertEqual((24, 24), template.shape)
+        self.assertLessEqual(len(palette), 8)
+
+        indexed = cimb.render(template, positions, values, atlas)
+        self.assertTrue(numpy.array_equal(frame, palette[indexed]))
+
+
+class PalettizeTest(TestCase):
+    def test_palettize(self):
+        a = numpy.array([[[1, 2, 3], [4, 5, 6]], [[1, 2, 3], [255, 0, 255]]], dtype=numpy.uint8)
+        b = numpy.array([[255, 0, 255], [7, 8, 9]], dtype=numpy.uint8)
+        palette, (ai, bi) = palettize(a, b)
+        self.assertEqual(4, len(palette))
+        self.assertEqual((2, 2), ai.shape)
+        self.assertEqual((2,), bi.shape)
+        self.assertTrue(numpy.array_equal(a, palette[ai]))
+        self.assertTrue(numpy.array_equal(b, palette[bi]))
+
+    def test_too_many_colors(self):
+        img = numpy.arange(300 * 3, dtype=numpy.uint16).reshape(300, 3).astype(numpy.uint8)
+        img[:, 0] = numpy.arange(300) // 256
+        with self.assertRaises(Exception):
+            palettize(img)
@@ -1,20 +1,62 @@
 import random
-from os import path
+import subprocess
+import sys
+import types
+from glob import glob
+from os import makedirs, path
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import patch
 
 import cv2
 import numpy
-
-from cimbar.cimbar import encode, decode, bits_per_op
+from PIL import Image
+
+from cimbar.cimbar import (
+    encode, encode_frames, encode_frame_iter, decode, decode_frame, decode_iter, frame_sources, bits_per_op,
+    deinterleave_order, interleaved_cell_positions, _chunk_collector, _chunks_per_frame, _decode_image, _ecc_stream,
+    _fountain_chunk_size, _get_image_template, _parse_frame_range, _probe_frame_header, _render_frame
+)
+from cimbar.encode.cimb_translator import CimbDecoder
 from cimbar.encode.rss import reed_solomon_stream
+from cimbar.fountain.segmented_encoder_stream import segmented_encoder_stream
 from cimbar.grader import evaluate_split, evaluate_interleaved
+from cimbar.util.video import raw_frames, raw_writer, video_frames
 
 
 CIMBAR_ROOT = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..'))
 
 
+class _systematic_encoder:
+    '''
+    stands in for pywirehair, which isn't always installed. Chunks below the block count are the data. The ones after
+    start with the (padded) short block, then repeat the others. Decodes once it has one of each.
+    '''
+    def __init__(self, data, block_size):
+        self.blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+        self.block_size = block_size
+
+    def encode(self, chunk_id):
+        if chunk_id < len(self.blocks):
+            return self.blocks[chunk_id]
+        block = self.blocks[(chunk_id - 1) % len(self.blocks)]
+        return block + bytes(self.block_size - len(block))
+
+
+class _systematic_decoder:
+    def __init__(self, size, block_size):
+        self.size = size
+        self.num_blocks = -(-size // block_size)
+        self.blocks = {}
+
+    def decode(self, chunk_id, data):
+        index = chunk_id if chunk_id < self.num_blocks else (chunk_id - 1) % self.num_blocks
+        self.blocks[index] = data
+        if len(self.blocks) < self.num_blocks:
+            return None
+        return b''.join(self.blocks[i] for i in range(self.num_blocks))[:self.size]
+
+
 def _warp1(src_image, dst_image):
     img = cv2.imread(src_image)
     input_pts = [(0, 0), (0, 1023), (1023, 0), (1023, 1023)]
@@ -97,6 +139,83 @@ class CimbarTest(TestCase):
         decode([self.encoded_file], out_no_ecc, dark=True, ecc=0)
         self.validate_grader(out_no_ecc, 200)
 
+    def test_decode_parallel(self):
+        out_path = self._temp_path('outfile.txt')
+        self.assertEqual(3, decode([self.encoded_file] * 3, out_path, dark=True, jobs=2))
+
+        with open(out_path, 'rb') as f:
+            contents = f.read()
+        self.assertEqual(self._src_data()[:7500] * 3, contents)
+
+    def test_decode_arrays(self):
+        img = cv2.imread(self.encoded_file)
+        out_path = self._temp_path('outfile.txt')
+        decode([img], out_path, dark=True, deskew=False)
+        self.validate_output(out_path)
+
+        # parallel: the images go to the workers through shared memory
+        decode([img, self.encoded_file, img], out_path, dark=True, deskew=False, jobs=2)
+        with open(out_path, 'rb') as f:
+            contents = f.read()
+        self.assertEqual(self._src_data()[:7500] * 3, contents)
+
+    def test_decode_video(self):
+        img = cv2.imread(self.encoded_file)
+        video = self._temp_path('capture.mkv')
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'FFV1'), 10, (img.shape[1], img.shape[0]))
+        for _ in range(2):
+            writer.write(img)
+        writer.release()
+
+        out_path = self._temp_path('outfile.txt')
+        self.assertEqual(1, decode(frame_sources([video], stride=2), out_path, dark=True, deskew=False))
+        self.validate_output(out_path)
+
+    def test_decode_frame(self):
+        frame = decode_frame(self.encoded_file, True, False, 1, deskew=False, auto_dewarp=False)
+
+        values = next(encode_frame_iter(self.src_file, 30, False))
+        expected = {tuple(xy): v for xy, v in zip(interleaved_cell_positions(), values)}
+        actual = {tuple(xy): v for xy, v in zip(frame.cells, frame.bits)}
+        self.assertEqual(expected, actual)
+
+        self.assertEqual(len(values), len(frame.symbol_distance))
+        self.assertEqual(0, frame.symbol_distance.max())
+        self.assertEqual(len(values), len(frame.color_distance))
+
+    def test_probe_frame_header(self):
+        img = Image.open(self.encoded_file)
+        ct = CimbDecoder(True, symbol_bits=4, color_bits=2)
+        self.assertEqual(self._src_data()[:6], _probe_frame_header(ct, img, img, 30, 6))
+
+    def test_decode_skips_seen_frame(self):
+        state_info = {'seen_headers': set(), 'ecc': 30, 'header_length': 6}
+        self.assertTrue(list(decode_iter(self.encoded_file, True, False, 1, False, False, state_info)))
+        self.assertEqual(self._src_data()[:6], state_info['probed_header'])
+        # not until the fountain decoder has it
+        self.assertEqual(set(), state_info['seen_headers'])
+
+        state_info['seen_headers'].add(state_info['probed_header'])
+        self.assertEqual([], list(decode_iter(self.encoded_file, True, False, 1, False, False, state_info)))
+
+    def _decode_image(self, dedupe):
+        collector = _chunk_collector(_fountain_chunk_size(30))
+        outstream = _ecc_stream(collector, 30, 155, mode='write', on_failure=b'')
+        return _decode_image(self.encoded_file, outstream, None, collector, deinterleave_order(), True, False, 1,
+                             False, False, dedupe=dedupe)
+
+    def test_decode_image_marks_seen(self):
+        dedupe = {'seen_headers': set(), 'ecc': 30, 'header_length': 6}
+        self.assertTrue(self._decode_image(dedupe))
+        self.assertEqual({self._src_data()[:6]}, dedupe['seen_headers'])
+        self.assertFalse(self._decode_image(dedupe))
+
+        # the probe got it wrong, so the frame's chunks don't vouch for it. Don't skip the next copy on its say-so
+        dedupe = {'seen_headers': set(), 'ecc': 30, 'header_length': 6}
+        with patch('cimbar.cimbar._probe_frame_header', return_value=b'wrong!'):
+            self.assertTrue(self._decode_image(dedupe))
+        self.assertEqual(set(), dedupe['seen_headers'])
+
     def test_decode_perspective(self):
         skewed_image = self._temp_path('skewed.jpg')
         _warp1(self.encoded_file, skewed_image)
@@ -141,6 +260,185 @@ class CimbarTest(TestCase):
         self.assertLess(num_bits, 350)
 
 
+class EncodeTest(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.src_file = path.join(self.temp_dir.name, 'infile.txt')
+        with open(self.src_file, 'wb') as f:
+            f.write(bytearray(random.getrandbits(8) for _ in range(7500)))
+
+    def tearDown(self):
+        with self.temp_dir:
+            pass
+
+    def test_encode_parallel(self):
+        serial = path.join(self.temp_dir.name, 'serial.png')
+        encode(self.src_file, serial, dark=True)
+
+        parallel = path.join(self.temp_dir.name, 'parallel.png')
+        encode(self.src_file, parallel, dark=True, jobs=2)
+
+        self.assertTrue(numpy.array_equal(cv2.imread(serial), cv2.imread(parallel)))
+
+    def test_encode_palette(self):
+        dst_image = path.join(self.temp_dir.name, 'encode.png')
+        encode(self.src_file, dst_image, dark=True)
+        with Image.open(dst_image) as img:
+            self.assertEqual('P', img.mode)
+            self.assertLessEqual(len(img.getcolors()), 8)
+            rgb = numpy.array(img.convert('RGB'))
+
+        values = next(encode_frame_iter(self.src_file, 30, False))
+        self.assertTrue(numpy.array_equal(_render_frame(values, True), rgb))
+
+    def test_encode_animated(self):
+        # without fountain encoding, every input is one frame. So make up a two frame encode
+        values = next(encode_frame_iter(self.src_file, 30, False))
+        two_frames = [(0, values), (1, values[::-1].copy())]
+
+        def encode_frames(*args):
+            return iter(two_frames)
+
+        pngs = path.join(self.temp_dir.name, 'frames.png')
+        apng = path.join(self.temp_dir.name, 'frames.apng')
+        video = path.join(self.temp_dir.name, 'frames.mkv')
+        with patch('cimbar.cimbar.encode_frames', encode_frames):
+            encode(self.src_file, pngs, dark=True)
+            encode(self.src_file, apng, dark=True, fps=10)
+            encode(self.src_file, video, dark=True, jobs=2)
+        expected = [cv2.imread(pngs), cv2.imread(f'{pngs}.1.png')]
+        self.assertFalse(numpy.array_equal(*expected))
+
+        with Image.open(apng) as img:
+            self.assertEqual(2, img.n_frames)
+            self.assertEqual(100, img.info['duration'])
+            frames = []
+            for i in range(img.n_frames):
+                img.seek(i)
+                frames.append(cv2.cvtColor(numpy.array(img.convert('RGB')), cv2.COLOR_RGB2BGR))
+
+        video_res = list(video_frames(video))
+
+        raw = path.join(self.temp_dir.name, 'frames.rgb')
+        with raw_writer(raw) as writer:
+            for frame_num, img in enumerate(expected):
+                writer.write(frame_num, cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        raw_res = list(raw_frames(raw, 1024, 1024))
+
+        for res in (frames, video_res, raw_res):
+            self.assertEqual(2, len(res))
+            self.assertTrue(all(numpy.array_equal(a, b) for a, b in zip(expected, res)))
+
+    def test_pack(self):
+        src_dir = path.join(self.temp_dir.name, 'src')
+        makedirs(path.join(src_dir, 'sub'))
+        files = {'one.txt': b'first file', 'sub/two.bin': bytes(random.getrandbits(8) for _ in range(3000))}
+        for name, contents in files.items():
+            with open(path.join(src_dir, name), 'wb') as f:
+                f.write(contents)
+
+        dst_image = path.join(self.temp_dir.name, 'pack.png')
+        encode([path.join(src_dir, 'one.txt'), path.join(src_dir, 'sub')], dst_image, dark=True)
+
+        out_dir = path.join(self.temp_dir.name, 'out')
+        decode([dst_image], out_dir, dark=True, deskew=False, unpack=True)
+        for name, contents in files.items():
+            with open(path.join(out_dir, name), 'rb') as f:
+                self.assertEqual(contents, f.read())
+
+    def test_segment_size_option(self):
+        # too small to be a segment. The encoder gets the size from the command line, and says so
+        res = subprocess.run(
+            [sys.executable, '-m', 'cimbar.cimbar', '--encode', self.src_file, path.join(self.temp_dir.name, 'x.png'),
+             '--segmented', '--segment-size=100'], capture_output=True, cwd=CIMBAR_ROOT, text=True
+        )
+        self.assertNotEqual(0, res.returncode)
+        self.assertIn('segment_size 100 is too small', res.stderr)
+
+    def test_stdin_stdout(self):
+        with open(self.src_file, 'rb') as f:
+            src_data = f.read()
+        dst_image = path.join(self.temp_dir.name, 'encode.png')
+        cimbar = [sys.executable, '-m', 'cimbar.cimbar']
+        subprocess.run(cimbar + ['--encode', '-', dst_image], input=src_data, check=True, cwd=CIMBAR_ROOT)
+
+        with open(dst_image, 'rb') as f:
+            res = subprocess.run(
+                cimbar + ['-', '-o', '-', '--deskew=0'], input=f.read(), capture_output=True, check=True, cwd=CIMBAR_ROOT
+            )
+        # and nothing else: the logging all went to stderr
+        self.assertEqual(src_data, res.stdout)
+        self.assertIn(b'decode', res.stderr)
+
+    def test_encode_frames(self):
+        all_frames = list(encode_frame_iter(self.src_file, 30, False))
+        frames = list(encode_frames(self.src_file, 30, False, start=0, stop=1))
+        self.assertEqual(1, len(frames))
+        self.assertEqual(0, frames[0][0])
+        self.assertTrue(numpy.array_equal(all_frames[0], frames[0][1]))
+
+        self.assertEqual([], list(encode_frames(self.src_file, 30, False, start=1)))
+
+    def test_chunks_per_frame(self):
+        # sq8x8 frames are exactly 12 fountain chunks, so fountain encodes can start at any frame
+        self.assertEqual(12, _chunks_per_frame(_fountain_chunk_size(30), 30))
+        self.assertIsNone(_chunks_per_frame(_fountain_chunk_size(30) + 1, 30))
+
+    def test_parse_frame_range(self):
+        self.assertEqual((0, None), _parse_frame_range(None))
+        self.assertEqual((5, 6), _parse_frame_range('5'))
+        self.assertEqual((5, 10), _parse_frame_range('5:10'))
+        self.assertEqual((5, None), _parse_frame_range('5:'))
+        self.assertEqual((0, 10), _parse_frame_range(':10'))
+
+
+class ImageTemplateTest(TestCase):
+    def test_template_is_cached(self):
+        template = _get_image_template(1024, True)
+        self.assertEqual((1024, 1024, 3), template.shape)
+        self.assertIs(template, _get_image_template(1024, True))
+        self.assertFalse(template.flags.writeable)
+
+        # anchors in the corners, black background otherwise
+        self.assertEqual([255, 255, 255], list(template[3, 3]))
+        self.assertEqual([0, 0, 0], list(template[512, 512]))
+
+
+class ParallelFountainTest(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.src_file = path.join(self.temp_dir.name, 'infile.bin')
+        with open(self.src_file, 'wb') as f:
+            f.write(bytes(random.getrandbits(8) for _ in range(20000)))
+
+        wirehair = types.ModuleType('pywirehair')
+        wirehair.encoder = _systematic_encoder
+        wirehair.decoder = _systematic_decoder
+        self.wirehair = patch.dict(sys.modules, {'pywirehair': wirehair})
+        self.wirehair.start()
+
+    def tearDown(self):
+        self.wirehair.stop()
+        with self.temp_dir:
+            pass
+
+    def test_decode_duplicates(self):
+        # 33 fountain blocks, 12 chunks per frame. The first 3 frames have all 32 full blocks, and the padded short one
+        dst_image = path.join(self.temp_dir.name, 'encode.png')
+        encode(self.src_file, dst_image, dark=True, fountain=True, stop=3)
+        frames = [dst_image, f'{dst_image}.1.png', f'{dst_image}.2.png']
+
+        # like a video capture: every frame more than once, and out of order
+        src_images = [frames[0], frames[0], frames[1], frames[0], frames[2], frames[1], frames[2], frames[2]]
+        out_path = path.join(self.temp_dir.name, 'out.bin')
+        frames_used = decode(src_images, out_path, dark=True, fountain=True, color_correct=1, deskew=False, jobs=2)
+        # each frame decoded once. The copies are skipped, either as seen or as still in progress
+        self.assertEqual(3, frames_used)
+
+        with open(out_path, 'rb') as f, open(self.src_file, 'rb') as expected:
+            self.assertEqual(expected.read(), f.read())
+
+
 class RoundtripTest(TestCase):
     def setUp(self):
         self.temp_dir = TemporaryDirectory()
@@ -167,3 +465,17 @@ class RoundtripTest(TestCase):
         with open(self.src_file, 'rb') as f:
             expected = f.read()
         self.assertEqual(contents, expected)
+
+    def test_roundtrip_segmented(self):
+        # ~4KB once it's compressed. That's 3 segments of 1500
+        dst_image = path.join(self.temp_dir.name, 'encode.png')
+        with patch.object(segmented_encoder_stream, '_next_segment', autospec=True,
+                          side_effect=segmented_encoder_stream._next_segment) as next_segment:
+            encode(self.src_file, dst_image, dark=True, fountain='segmented', segment_size=1500)
+        self.assertEqual(3, next_segment.call_count)
+
+        out_path = path.join(self.temp_dir.name, 'out.txt')
+        frames = [dst_image] + sorted(glob(dst_image + '.*.png'))
+        decode(frames, out_path, dark=True, deskew=False, fountain='segmented')
+        with open(out_path, 'rb') as f, open(self.src_file, 'rb') as expected:
+            self.assertEqual(expected.read(), f.read())
@@ -0,0 +1,112 @@
+from io import BytesIO
+from os import path, urandom
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import zstandard as zstd
+
+from cimbar.util.compression import (
+    choose_params, compressing_reader, dictionary_decompressor, sample_ratio, train_dictionary
+)
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.random_file = path.join(self.temp_dir.name, 'random.bin')
+        with open(self.random_file, 'wb') as f:
+            f.write(urandom(500000))
+
+        self.text_file = path.join(self.temp_dir.name, 'text.txt')
+        with open(self.text_file, 'wb') as f:
+            f.write(b''.join(f'line {i}: the quick brown fox\n'.encode() for i in range(20000)))
+
+    def tearDown(self):
+        with self.temp_dir:
+            pass
+
+    def test_sample_ratio(self):
+        with open(self.random_file, 'rb') as f:
+            self.assertGreater(sample_ratio(f), 0.99)
+            self.assertEqual(0, f.tell())
+        with open(self.text_file, 'rb') as f:
+            self.assertLess(sample_ratio(f), 0.5)
+
+    def test_choose_params(self):
+        with open(self.random_file, 'rb') as f:
+            self.assertEqual((1, 0), choose_params(f, 16))
+            self.assertEqual((1, 4), choose_params(f, 16, threads=4))
+        with open(self.text_file, 'rb') as f:
+            self.assertEqual((16, 0), choose_params(f, 16))
+
+        with patch('cimbar.util.compression.os.cpu_count', lambda: 8), \
+                patch('cimbar.util.compression.THREADED_MIN_SIZE', 1000), open(self.text_file, 'rb') as f:
+            self.assertEqual((16, 8), choose_params(f, 16))
+
+    def test_same_output_on_any_host(self):
+        # unknown size, like stdin. At level 1, zstd's threaded and unthreaded output differ by 3MB or so
+        text = b''.join(f'line {i}: the quick brown fox\n'.encode() for i in range(100000))
+        outputs = set()
+        for cpus in (None, 1, 2, 4):
+            with patch('cimbar.util.compression.os.cpu_count', lambda: cpus):
+                _, threads = choose_params(BytesIO(text), 1)
+            with compressing_reader(BytesIO(text), 1, threads) as reader:
+                outputs.add(reader.read())
+        self.assertEqual(1, len(outputs))
+
+    def test_compressing_reader(self):
+        with open(self.text_file, 'rb') as f:
+            expected = f.read()
+
+        with compressing_reader(open(self.text_file, 'rb'), level=3) as reader:
+            compressed = b''
+            while True:
+                bites = reader.read(1000)
+                if not bites:
+                    break
+                compressed += bites
+
+            self.assertEqual((len(expected), len(compressed)), reader.stats())
+            self.assertIn(f'compressed {len(expected)} -> {len(compressed)} bytes', reader.report())
+        self.assertEqual(expected, zstd.ZstdDecompressor().stream_reader(compressed).read())
+
+
+def _record(i):
+    return f'{{"device": "sensor-{i % 37}", "ts": {1700000000 + i * 17}, "status": "ok", "temp": {i % 23}.5}}\n'
+
+
+class DictionaryTest(TestCase):
+    def setUp(self):
+        self.samples = [''.join(_record(i + j) for j in range(10)).encode() for i in range(0, 5000, 10)]
+        self.dictionary = train_dictionary(self.samples, 4096, dict_id=1234)
+        self.other = train_dictionary(self.samples[::-1], 4096, dict_id=99)
+        self.payload = ''.join(_record(i) for i in range(7000, 7010)).encode()
+
+    def _compress(self, dict_data=None):
+        with compressing_reader(BytesIO(self.payload), dict_data=dict_data) as reader:
+            return reader.read()
+
+    def _decompress(self, compressed, dictionaries, write_size=7):
+        out = BytesIO()
+        out.close = lambda: None  # so we can look at it afterwards
+        with dictionary_decompressor(out, dictionaries) as dd:
+            for i in range(0, len(compressed), write_size):
+                dd.write(compressed[i:i+write_size])
+        return out.getvalue()
+
+    def test_roundtrip(self):
+        compressed = self._compress(self.dictionary)
+        self.assertEqual(1234, zstd.get_frame_parameters(compressed).dict_id)
+        self.assertLess(len(compressed), len(self._compress()))
+
+        self.assertEqual(self.payload, self._decompress(compressed, [self.other, self.dictionary]))
+
+    def test_no_dictionary(self):
+        self.assertEqual(self.payload, self._decompress(self._compress(), []))
+        self.assertEqual(self.payload, self._decompress(self._compress(), [self.dictionary], write_size=1000))
+
+    def test_missing_dictionary(self):
+        with self.assertRaises(Exception) as e:
+            self._decompress(self._compress(self.dictionary), [self.other])
+        self.assertIn('1234', str(e.exception))
@@ -2,9 +2,11 @@ from io import BytesIO
 from os import path
 from unittest import TestCase
 
-from cimbar.fountain.header import fountain_header
+from cimbar.fountain.header import fountain_header, segment_header
 from cimbar.fountain.fountain_decoder_stream import fountain_decoder_stream
 from cimbar.fountain.fountain_encoder_stream import fountain_encoder_stream
+from cimbar.fountain.segmented_decoder_stream import segmented_decoder_stream
+from cimbar.fountain.segmented_encoder_stream import segmented_encoder_stream
 
 
 CIMBAR_ROOT = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..'))
@@ -42,6 +44,23 @@ class FountainHeaderTest(TestCase):
         self.assertEqual(b'\x81\x07\x08\x09\x00\x00', bytes(fe))
 
 
+class SegmentHeaderTest(TestCase):
+    def test_header_encode(self):
+        self.assertEqual(b'\x01\x00\x02\x00\x04\x00\x00\x03', bytes(segment_header(1, 2, 1024, 3)))
+        self.assertEqual(b'\x81\xff\xff\xff\xff\xff\x00\x03', bytes(segment_header(1, 0xFFFF, 0xFFFFFF, 3, True)))
+
+    def test_header_decode(self):
+        h = segment_header(b'\x81\x00\x02\x00\x04\x00\x00\x03')
+        self.assertEqual(1, h.encode_id)
+        self.assertEqual(2, h.segment_id)
+        self.assertEqual(1024, h.segment_size)
+        self.assertEqual(3, h.chunk_id)
+        self.assertTrue(h.last)
+        self.assertFalse(h.bad())
+
+        self.assertTrue(segment_header(b'\0' * 8).bad())
+
+
 class FountainTest(TestCase):
     def test_encode(self):
         data = b'0123456789' * 100
@@ -52,6 +71,16 @@ class FountainTest(TestCase):
 
         self.assertEqual(b'\x00\x00\x03\xe8\x00\x00' + data[:394], r)
 
+    def test_seek(self):
+        data = b'0123456789' * 100
+        fes = fountain_encoder_stream(BytesIO(data), 400)
+        chunks = [fes.read(400) for _ in range(6)]
+
+        for i in [5, 1, 3, 2]:
+            fes = fountain_encoder_stream(BytesIO(data), 400)
+            fes.seek(i)
+            self.assertEqual(chunks[i], fes.read(400))
+
     def test_round_trip(self):
         data = b'0123456789' * 100
         inbuff = BytesIO(data)
@@ -71,3 +100,45 @@ class FountainTest(TestCase):
 
         outbuff.seek(0)
         self.assertEqual(data, outbuff.read())
+
+
+class SegmentedFountainTest(TestCase):
+    def test_round_trip(self):
+        data = bytes(range(256)) * 20
+        fes = segmented_encoder_stream(BytesIO(data), 400, segment_size=2000)
+
+        outbuff = BytesIO()
+        dec = segmented_decoder_stream(outbuff, 400)
+
+        # 3 segments: 2000, 2000, 1120 bytes
+        chunks = []
+        while not fes.exhausted:
+            chunks.append(fes.read(400))
+        self.assertEqual(b'', fes.read(400))
+        self.assertEqual([0, 1, 2], sorted({segment_header(c).segment_id for c in chunks}))
+        self.assertTrue(segment_header(chunks[-1]).last)
+
+        # the segments can show up in any order
+        for c in reversed(chunks):
+            dec.write(c)
+        self.assertTrue(dec.done)
+        self.assertEqual(data, outbuff.getvalue())
+
+    def test_short_tail(self):
+        # 2000 + 2000 + 300 bytes. 300 is less than one 392 byte chunk, too few for wirehair
+        data = bytes(range(256)) * 16 + bytes(204)
+        fes = segmented_encoder_stream(BytesIO(data), 400, segment_size=2000)
+
+        outbuff = BytesIO()
+        dec = segmented_decoder_stream(outbuff, 400)
+
+        chunks = []
+        while not fes.exhausted:
+            chunks.append(fes.read(400))
+        sizes = {segment_header(c).segment_id: segment_header(c).segment_size for c in chunks}
+        self.assertEqual({0: 2000, 1: 2300}, sizes)
+
+        for c in chunks:
+            dec.write(c)
+        self.assertTrue(dec.done)
+        self.assertEqual(data, outbuff.getvalue())
@@ -1,7 +1,10 @@
 
+from io import BytesIO
 from unittest import TestCase
 
-from cimbar.util.interleave import interleave, interleave_reverse
+from cimbar.util.interleave import (
+    interleave, interleave_reverse, interleave_permutation, deinterleave_bytes, deinterleave_distance, interleaved_writer
+)
 
 
 class InterleaveTest(TestCase):
@@ -67,3 +70,28 @@ class InterleaveTest(TestCase):
             0, 5, 1, 6, 2, 7, 3, 8, 4, 9,
             10, 15, 11, 16, 12, 17, 13, 18, 14, 19
         ])
+
+    def test_deinterleave_bytes(self):
+        a = list(range(30))
+        values = [(i * 7) % 16 for i in a]
+
+        lookup, block_size = interleave_reverse(a, 5, partitions=2)
+        outbuff = BytesIO()
+        with interleaved_writer(f=outbuff, bits_per_op=4, mode='write', keep_open=True) as iw:
+            for i, v in enumerate(values):
+                iw.write(v, lookup[i] // block_size)
+
+        perm = interleave_permutation(a, 5, partitions=2)
+        self.assertEqual(list(perm[:3]), [0, 5, 10])
+        self.assertEqual(outbuff.getvalue(), deinterleave_bytes(values, perm, 4))
+
+    def test_deinterleave_distance(self):
+        a = list(range(6))
+        perm = interleave_permutation(a, 3)
+        self.assertEqual(list(perm), [0, 3, 1, 4, 2, 5])
+
+        # 6 cells * 4 bits -> 3 bytes, 2 cells per byte
+        distance = [0, 1, 2, 3, 4, 5]
+        self.assertEqual([3, 4, 5], list(deinterleave_distance(distance, perm, 4)))
+        # 6 cells * 6 bits -> 5 bytes (rounded up)
+        self.assertEqual([3, 3, 4, 5, 5], list(deinterleave_distance(distance, perm, 6)))
@@ -0,0 +1,55 @@
+from io import BytesIO
+from unittest import TestCase
+
+import numpy
+
+from cimbar.encode.ldpc import LdpcCodec, ldpc_stream
+from cimbar.encode.reed_solomon import ReedSolomonCodec
+
+
+class LdpcTest(TestCase):
+    def setUp(self):
+        self.rng = numpy.random.default_rng(1)
+
+    def test_encode_is_systematic(self):
+        codec = LdpcCodec(30, 155)
+        msgs = self.rng.integers(0, 256, (4, 125), dtype=numpy.uint8)
+        encoded = codec.encode_blocks(msgs)
+        self.assertEqual((4, 155), encoded.shape)
+        self.assertTrue(numpy.array_equal(msgs, encoded[:, :125]))
+        self.assertFalse(codec._syndromes(numpy.unpackbits(encoded, axis=1)).any())
+
+    def test_decode_bit_errors(self):
+        codec = LdpcCodec(30, 155)
+        msgs = self.rng.integers(0, 256, (8, 125), dtype=numpy.uint8)
+        bits = numpy.unpackbits(codec.encode_blocks(msgs), axis=1)
+
+        # 20 flipped bits per block, each in a different byte. Reed solomon can only fix 15 bad bytes
+        flips = numpy.zeros_like(bits)
+        for block in flips:
+            bad_bytes = self.rng.choice(155, 20, replace=False)
+            block[bad_bytes * 8 + self.rng.integers(0, 8, 20)] = 1
+        llr = (1 - 2 * (bits ^ flips).astype(numpy.float64)) * 5
+        decoded, ok = codec.decode_llr(llr)
+        self.assertTrue(ok.all())
+        self.assertTrue(numpy.array_equal(bits, decoded))
+
+        # the same error pattern, on reed solomon codewords for the same messages
+        rs = ReedSolomonCodec(30, 155)
+        noisy = rs.encode_blocks(msgs) ^ numpy.packbits(flips, axis=1)
+        self.assertEqual([None] * 8, rs.decode_blocks(noisy))
+
+    def test_stream_round_trip(self):
+        data = self.rng.integers(0, 256, 125 * 3 + 40, dtype=numpy.uint8).tobytes()
+        encoded = bytearray(ldpc_stream(BytesIO(data), 30, 155).read(len(data)))
+        self.assertEqual(155 * 3 + 70, len(encoded))
+
+        # clobber some bits, and say which ones we aren't sure about
+        reliability = numpy.full(len(encoded) * 8, 9.0)
+        for byte in [3, 50, 160, 161, 400, 500]:
+            encoded[byte] ^= 0x21
+            reliability[byte*8:byte*8+8] = 0.5
+
+        outbuff = BytesIO()
+        ldpc_stream(outbuff, 30, 155, mode='write').write(bytes(encoded), reliability)
+        self.assertEqual(data, outbuff.getvalue())
@@ -0,0 +1,82 @@
+from os import makedirs, path, urandom
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from cimbar.util.pack import pack_index, pack_reader, pack_writer
+
+
+class PackTest(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.src = path.join(self.temp_dir.name, 'src')
+        makedirs(path.join(self.src, 'sub', 'deeper'))
+        self.files = {
+            'a.txt': b'hello world',
+            'empty': b'',
+            'sub/b.bin': urandom(5000),
+            'sub/deeper/c.bin': urandom(300),
+        }
+        for name, contents in self.files.items():
+            with open(path.join(self.src, name), 'wb') as f:
+                f.write(contents)
+
+    def tearDown(self):
+        with self.temp_dir:
+            pass
+
+    def _pack(self, read_size):
+        reader = pack_reader([path.join(self.src, 'a.txt'), path.join(self.src, 'empty'), path.join(self.src, 'sub')])
+        with reader:
+            res = b''
+            while True:
+                bites = reader.read(read_size)
+                if not bites:
+                    break
+                res += bites
+        self.assertEqual(reader.len, len(res))
+        return res
+
+    def _unpack(self, packed, dst, write_size):
+        with pack_writer(dst) as writer:
+            for i in range(0, len(packed), write_size):
+                writer.write(packed[i:i+write_size])
+
+    def _check(self, dst):
+        for name, contents in self.files.items():
+            with open(path.join(dst, name), 'rb') as f:
+                self.assertEqual(contents, f.read(), name)
+
+    def test_roundtrip(self):
+        packed = self._pack(-1)
+        for read_size in (1, 7, 4096):
+            self.assertEqual(packed, self._pack(read_size))
+
+        for write_size in (1, 13, len(packed)):
+            dst = path.join(self.temp_dir.name, f'dst{write_size}')
+            # trailing junk, like frame padding, is ignored
+            self._unpack(packed + b'\0' * 100, dst, write_size)
+            self._check(dst)
+
+    def test_index(self):
+        packed = self._pack(-1)
+        index = pack_index([('a.txt', 11), ('empty', 0), ('sub/b.bin', 5000), ('sub/deeper/c.bin', 300)])
+        self.assertEqual(index, packed[:len(index)])
+        self.assertEqual(len(index) + 5311, len(packed))
+
+    def test_bad_names(self):
+        for name in ('../escape', '/abs', 'a/../../b', ''):
+            with self.assertRaises(Exception):
+                self._unpack(pack_index([(name, 1)]) + b'x', path.join(self.temp_dir.name, 'bad'), 100)
+        self.assertFalse(path.exists(path.join(self.temp_dir.name, 'escape')))
+
+    def test_not_an_archive(self):
+        with self.assertRaises(Exception):
+            self._unpack(b'not a pack archive', path.join(self.temp_dir.name, 'bad'), 100)
+
+    def test_duplicate_names(self):
+        # files go in by basename, and a directory by its own name. Neither can silently overwrite the other
+        with open(path.join(self.src, 'sub', 'a.txt'), 'wb') as f:
+            f.write(b'another a.txt')
+        for filenames in (['a.txt', 'sub/a.txt'], ['sub', 'sub/deeper/../../sub']):
+            with self.assertRaises(Exception):
+                pack_reader([path.join(self.src, f) for f in filenames])
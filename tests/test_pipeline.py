@@ -0,0 +1,66 @@
+import time
+from unittest import TestCase
+
+from cimbar.util.pipeline import pipeline, stage
+
+
+def _slow_for_evens(x):
+    if x % 2 == 0:
+        time.sleep(0.05)
+    return x
+
+
+class PipelineTest(TestCase):
+    def test_ordered(self):
+        stages = [stage(lambda x: x + 1, 1), stage(_slow_for_evens, 3), stage(lambda x: x * 2, 2)]
+        self.assertEqual([(x + 1) * 2 for x in range(20)], list(pipeline(range(20), stages)))
+
+    def test_unordered(self):
+        stages = [stage(_slow_for_evens, 4)]
+        res = list(pipeline(range(8), stages, ordered=False))
+        self.assertEqual(list(range(8)), sorted(res))
+        self.assertNotEqual(list(range(8)), res)
+
+    def test_exception(self):
+        def boom(x):
+            if x == 3:
+                raise ValueError('boom')
+            return x
+
+        with self.assertRaises(ValueError):
+            list(pipeline(range(10), [stage(boom, 2)]))
+
+    def test_backpressure(self):
+        pulled = []
+
+        def source():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        res = pipeline(source(), [stage(lambda x: x, 1), stage(lambda x: x, 1)], queue_size=2)
+        self.assertEqual(0, next(res))
+        time.sleep(0.2)
+        # 3 full queues, 1 item in each stage, 1 in the feeder, 1 yielded. Nothing else is read ahead
+        self.assertLessEqual(len(pulled), 10)
+        res.close()
+
+    def test_ordered_backpressure(self):
+        pulled = []
+
+        def source():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        def slow_first(x):
+            if x == 0:
+                time.sleep(0.3)
+            return x
+
+        res = pipeline(source(), [stage(slow_first, 2)], queue_size=2)
+        self.assertEqual(0, next(res))
+        # while 0 was stuck, the other worker finished everything it could get: 2 queues of 2, 2 workers,
+        # 2 results waiting their turn, 1 in the feeder. Not the whole input
+        self.assertLessEqual(len(pulled), 10)
+        self.assertEqual(list(range(1, 100)), list(res))
@@ -0,0 +1,97 @@
+import gc
+import random
+import weakref
+from unittest import TestCase
+
+import numpy
+from reedsolo import RSCodec
+
+from cimbar.encode.reed_solomon import ReedSolomonCodec, ReedSolomonError
+
+
+class ReedSolomonCodecTest(TestCase):
+    def setUp(self):
+        self.reference = RSCodec(30, nsize=155, fcr=1, prim=0x187)
+        self.rs = ReedSolomonCodec(30, nsize=155, fcr=1, prim=0x187)
+
+    def _codewords(self, num_blocks):
+        msg = bytes(random.getrandbits(8) for _ in range(125 * num_blocks))
+        return msg, bytearray(self.reference.encode(msg))
+
+    def test_syndromes_clean(self):
+        _, encoded = self._codewords(4)
+        blocks = numpy.frombuffer(bytes(encoded), dtype=numpy.uint8).reshape(4, 155)
+        self.assertFalse(self.rs.syndromes(blocks).any())
+
+        encoded[200] ^= 0x10
+        blocks = numpy.frombuffer(bytes(encoded), dtype=numpy.uint8).reshape(4, 155)
+        self.assertEqual([False, True, False, False], list(self.rs.syndromes(blocks).any(axis=1)))
+
+    def test_decode_errors(self):
+        msg, encoded = self._codewords(3)
+        for pos in random.sample(range(155), 15):
+            encoded[pos] ^= random.randint(1, 255)
+        for pos in random.sample(range(155, 310), 16):  # too many
+            encoded[pos] ^= random.randint(1, 255)
+
+        res = self.rs.decode(bytes(encoded))
+        self.assertEqual(msg[:125], res[0])
+        self.assertIsNone(res[1])
+        self.assertEqual(msg[250:], res[2])
+
+    def test_codec_not_kept_alive(self):
+        rs = ReedSolomonCodec(30, nsize=155)
+        _, encoded = self._codewords(1)
+        rs.syndromes(numpy.frombuffer(bytes(encoded), dtype=numpy.uint8)[None, :])
+
+        ref = weakref.ref(rs)
+        del rs
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_decode_short_block(self):
+        msg = b'0123456789' * 5
+        encoded = bytearray(self.reference.encode(msg))
+        encoded[3] ^= 0xff
+        self.assertEqual([msg], self.rs.decode(bytes(encoded)))
+
+    def test_correct_erasures(self):
+        msg, encoded = self._codewords(1)
+        erased = random.sample(range(155), 30)
+        for pos in erased:
+            encoded[pos] = 0
+
+        self.assertEqual(msg, bytes(self.rs.correct(encoded, erase_pos=erased)[:125]))
+        with self.assertRaises(ReedSolomonError):
+            self.rs.correct(encoded)
+
+    def test_encode_matches_reedsolo(self):
+        for nsym, nsize in [(30, 155), (40, 216), (31, 161), (35, 182), (33, 163)]:
+            reference = RSCodec(nsym, nsize=nsize, fcr=1, prim=0x187)
+            rs = ReedSolomonCodec(nsym, nsize=nsize)
+            data = bytes(random.getrandbits(8) for _ in range((nsize - nsym) * 5 + 17))
+            self.assertEqual(bytes(reference.encode(data)), rs.encode(data))
+
+    def test_decode_with_distance(self):
+        msg, encoded = self._codewords(2)
+        bad = random.sample(range(155), 20)
+        for pos in bad:
+            encoded[pos] ^= random.randint(1, 255)
+
+        # 20 errors is too many on its own...
+        self.assertEqual([None, msg[125:]], self.rs.decode(bytes(encoded)))
+
+        # ...but fine once the decoder knows where to look
+        distance = numpy.zeros(310, dtype=numpy.int32)
+        distance[bad] = 15
+        distance[random.sample(range(155), 5)] += 10
+        self.assertEqual([msg[:125], msg[125:]], self.rs.decode(bytes(encoded), distance))
+
+    def test_decode_with_distance_past_capacity(self):
+        # guessing erasures must not turn a hopeless block into a wrong one
+        for _ in range(20):
+            msg, encoded = self._codewords(1)
+            for pos in random.sample(range(155), 40):
+                encoded[pos] ^= random.randint(1, 255)
+            distance = numpy.array([random.randint(0, 18) for _ in range(155)])
+            self.assertEqual([None], self.rs.decode(bytes(encoded), distance))
@@ -1,7 +1,10 @@
+import random
 from io import BytesIO
 from os import path
 from unittest import TestCase
 
+import numpy
+
 from cimbar.encode.rss import reed_solomon_stream
 
 
@@ -25,3 +28,19 @@ class ReedSolomonStreamTest(TestCase):
             outbuff.seek(0)
             self.assertEqual(s, outbuff.read())
 
+    def test_decode_color_distance(self):
+        # the color pass hands palette distances (0-30000ish) to the same erasure guessing as the symbol pass
+        msg = bytes(random.getrandbits(8) for _ in range(250))
+        encoded = bytearray(reed_solomon_stream(BytesIO(msg), 30, 155).read(250))
+        bad = random.sample(range(155), 20)  # correctable, with hints
+        for pos in bad:
+            encoded[pos] ^= random.randint(1, 255)
+        for pos in random.sample(range(155, 310), 40):  # hopeless
+            encoded[pos] ^= random.randint(1, 255)
+
+        distance = numpy.array([random.randint(0, 12000) for _ in range(310)])
+        distance[bad] = 25000
+
+        outbuff = BytesIO()
+        reed_solomon_stream(outbuff, 30, 155, mode='write', on_failure=b'').write(bytes(encoded), distance)
+        self.assertEqual(msg[:125], outbuff.getvalue())
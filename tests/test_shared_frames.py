@@ -0,0 +1,76 @@
+import subprocess
+import sys
+from multiprocessing import Pool
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy
+
+from cimbar.util.shared_frames import shared_frame_pool
+
+
+CIMBAR_ROOT = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..'))
+
+# the resource tracker runs in its own process, and complains on stderr. So we need a whole other python to watch it.
+# this is a parallel decode as decode() sets it up: the process pool first, then the shared memory
+_TRACKER_SCRIPT = '''
+import multiprocessing, os, sys
+from cimbar.cimbar import decode, encode
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('{}')
+    src, encoded = sys.argv[1:]
+    with open(src, 'wb') as f:
+        f.write(os.urandom(4000))
+    encode(src, encoded, dark=True)
+    decode([encoded], os.devnull, dark=True, ecc=0, deskew=False, jobs=2)
+'''
+
+
+def _checksum(frame):
+    return int(frame.array().sum())
+
+
+class SharedFramePoolTest(TestCase):
+    def test_round_trip(self):
+        img = numpy.arange(60, dtype=numpy.uint8).reshape(4, 5, 3)
+        with shared_frame_pool(2, img.nbytes) as pool:
+            first = pool.put(img)
+            second = pool.put(img[::-1].copy())
+            self.assertNotEqual(first.slot, second.slot)
+            self.assertTrue(numpy.array_equal(img, first.array()))
+            self.assertTrue(numpy.array_equal(img[::-1], second.array()))
+
+            with self.assertRaises(Exception):
+                pool.put(img)  # full
+
+            pool.release(first)
+            third = pool.put(img + 1)
+            self.assertEqual(first.slot, third.slot)
+            self.assertTrue(numpy.array_equal(img + 1, third.array()))
+
+    def test_too_large(self):
+        with shared_frame_pool(1, 10) as pool:
+            img = numpy.zeros(11, dtype=numpy.uint8)
+            self.assertFalse(pool.fits(img))
+            with self.assertRaises(Exception):
+                pool.put(img)
+
+    def test_other_process(self):
+        img = numpy.full((100, 100, 3), 2, dtype=numpy.uint8)
+        with shared_frame_pool(1, img.nbytes) as frames, Pool(1) as pool:
+            self.assertEqual(60000, pool.apply(_checksum, (frames.put(img),)))
+
+    def test_resource_tracker(self):
+        for method in ('fork', 'spawn'):
+            with TemporaryDirectory() as temp_dir:
+                res = subprocess.run(
+                    [sys.executable, '-c', _TRACKER_SCRIPT.format(method),
+                     path.join(temp_dir, 'infile'), path.join(temp_dir, 'encoded.png')],
+                    capture_output=True, cwd=CIMBAR_ROOT, text=True
+                )
+            self.assertEqual(0, res.returncode, res.stderr)
+            self.assertNotIn('KeyError', res.stderr)
+            self.assertNotIn('leaked', res.stderr)
+            self.assertNotIn('No such file', res.stderr)
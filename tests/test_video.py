@@ -0,0 +1,59 @@
+from io import BytesIO
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import cv2
+import numpy
+
+from cimbar.util.video import is_video, parse_frame_size, raw_frames, video_frames
+
+
+def _frames(count, width=32, height=24):
+    return [numpy.full((height, width, 3), (i * 10, 50, 200 - i * 10), dtype=numpy.uint8) for i in range(count)]
+
+
+class VideoTest(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        with self.temp_dir:
+            pass
+
+    def test_is_video(self):
+        self.assertTrue(is_video('capture.MP4'))
+        self.assertTrue(is_video('/tmp/x.mkv'))
+        self.assertFalse(is_video('frame.png'))
+
+    def test_parse_frame_size(self):
+        self.assertEqual((1920, 1080), parse_frame_size('1920x1080'))
+
+    def test_video_frames(self):
+        frames = _frames(5)
+        filename = path.join(self.temp_dir.name, 'test.mkv')
+        writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'FFV1'), 10, (32, 24))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+
+        res = list(video_frames(filename))
+        self.assertEqual(5, len(res))
+        self.assertTrue(all(numpy.array_equal(a, b) for a, b in zip(frames, res)))
+
+        res = list(video_frames(filename, stride=2))
+        self.assertEqual(3, len(res))
+        self.assertTrue(numpy.array_equal(frames[4], res[2]))
+
+    def test_raw_frames(self):
+        frames = _frames(4)
+        stream = BytesIO(b''.join(cv2.cvtColor(f, cv2.COLOR_BGR2RGB).tobytes() for f in frames) + b'partial')
+
+        res = list(raw_frames(stream, 32, 24))
+        self.assertEqual(4, len(res))
+        self.assertTrue(all(numpy.array_equal(a, b) for a, b in zip(frames, res)))
+
+        stream.seek(0)
+        res = list(raw_frames(stream, 32, 24, stride=3))
+        self.assertEqual(2, len(res))
+        self.assertTrue(numpy.array_equal(frames[3], res[1]))